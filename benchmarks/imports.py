@@ -0,0 +1,81 @@
+# TelegramDB
+# Copyright (C) 2023
+# Anony <github.com/anonyindian>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+"""
+Import time and memory of telegramdb in a fresh interpreter.
+
+Pyrogram and telethon are only imported by the backend of their own client,
+``eager`` imports both of them before telegramdb like every process used to.
+
+    python benchmarks/imports.py [runs]
+"""
+
+import json, os, statistics, subprocess, sys
+
+
+CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - started
+scale = 1 if sys.platform == "darwin" else 1024
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+    "modules": len(sys.modules),
+    "libraries": [name for name in ("pyrogram", "telethon") if name in sys.modules],
+}}))
+"""
+
+CASES = (
+    ("lazy", "import telegramdb"),
+    ("pyrogram", "import pyrogram, telegramdb"),
+    ("telethon", "import telethon, telegramdb"),
+    ("eager", "import pyrogram, telethon, telegramdb"),
+)
+
+
+def measure(imports: str, runs: int):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (root, os.environ.get("PYTHONPATH")))))
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD.format(imports=imports)],
+            env=env, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "seconds": statistics.median(result["seconds"] for result in results),
+        "max_rss": statistics.median(result["max_rss"] for result in results),
+        "modules": results[-1]["modules"],
+        "libraries": results[-1]["libraries"],
+    }
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"median of {runs} runs")
+    print(f"{'case':<10}{'ms':>9}{'MiB':>9}{'modules':>9}  libraries")
+    for label, imports in CASES:
+        result = measure(imports, runs)
+        print(f"{label:<10}{result['seconds'] * 1000:>9.1f}{result['max_rss'] / 2 ** 20:>9.1f}{result['modules']:>9}  {', '.join(result['libraries']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
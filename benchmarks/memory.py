@@ -0,0 +1,102 @@
+# TelegramDB
+# Copyright (C) 2023
+# Anony <github.com/anonyindian>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Memory used by the cached records of a partition.
+
+Compares the previous layout, a ``{"id", "data"}`` dict for every record and a
+``__dict__`` for every datapack, with the packed tuples of :class:`Partition`
+and the slotted datapacks generated from the members.
+
+    python benchmarks/memory.py [records]
+"""
+
+import os, sys, tracemalloc
+
+# the scripts import the package of the repository, not an installed one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from telegramdb import DataPack, Member, Partition
+
+
+class DictUser:
+    def __init__(self, id, name, username):
+        self.id = id
+        self.name = name
+        self.username = username
+
+
+class SlotUser(DataPack):
+    __datapack_name__ = "user"
+
+    id = Member(int, is_primary=True)
+    name = Member(str)
+    username = Member(str)
+
+    def __init__(self, id, name, username):
+        self.id = id
+        self.name = name
+        self.username = username
+
+
+def rows(count: int):
+    return [(i, f"name {i}", f"user{i}") for i in range(count)]
+
+
+def measure(function, count: int):
+    data = rows(count)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = function(data)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return used / count
+
+
+def dict_records(data):
+    return {i: {"id": i + 1, "data": {"id": i, "name": name, "username": username}} for i, name, username in data}
+
+
+def tuple_records(data):
+    partition = Partition("user")
+    for i, name, username in data:
+        partition.set(i, i + 1, {"id": i, "name": name, "username": username})
+    return partition
+
+
+def dict_objects(data):
+    return [DictUser(*row) for row in data]
+
+
+def slot_objects(data):
+    return [SlotUser(*row) for row in data]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"{count} records, bytes per record")
+    for label, function in (
+        ("dict records", dict_records),
+        ("tuple records", tuple_records),
+        ("dict datapacks", dict_objects),
+        ("slot datapacks", slot_objects),
+    ):
+        print(f"{label:<16}{measure(function, count):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
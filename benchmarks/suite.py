@@ -0,0 +1,200 @@
+# TelegramDB
+# Copyright (C) 2023
+# Anony <github.com/anonyindian>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+"""
+Startup, commit, lookup and memory benchmarks of a session at scale.
+
+The database chat is simulated by a :class:`MemoryBackend`, so it runs offline
+and the network is replaced by its latency. Every run is appended to a JSON
+lines file and compared with the previous run of the same size, the metrics
+which got worse by more than the tolerance are reported and the exit status
+is ``1``.
+
+    python benchmarks/suite.py [--records 10000,100000] [--latency 0.05]
+"""
+
+import argparse, asyncio, json, os, platform, random, resource, sys, time
+
+# the scripts import the package of the repository, not an installed one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from telegramdb import AsyncTelegramDB, DataPack, JSONCodec, Member, MemoryBackend, Scheduler, VERSION, encode_data
+
+
+CHAT_ID = -1
+
+# metrics where a higher value is better, the others are times
+HIGHER_IS_BETTER = {"commits_per_sec", "edits_per_sec"}
+
+
+class User(DataPack):
+    __datapack_name__ = "user"
+
+    id = Member(int, is_primary=True)
+    name = Member(str)
+    username = Member(str, index=True, unique=True)
+
+    def __init__(self, id, name=None, username=None):
+        self.id = id
+        self.name = name
+        self.username = username
+
+
+def rss():
+    """
+    Returns the resident memory of the process in bytes.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # peak instead of current memory where /proc isn't available
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def percentiles(samples: list):
+    samples = sorted(samples)
+    pick = lambda p: samples[min(len(samples) - 1, int(len(samples) * p))]
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def scheduler():
+    # the backend latency is measured, not the pacing of telegram
+    return Scheduler(rate=1e6, burst=10 ** 6, global_rate=1e6, read_rate=1e6)
+
+
+async def populate(backend: MemoryBackend, count: int):
+    codec = JSONCodec()
+    for i in range(count):
+        await backend.send(CHAT_ID, f"#user::{i}\n{encode_data({'id': i, 'name': f'name {i}', 'username': f'user{i}'}, codec)}")
+
+
+async def session(backend: MemoryBackend, options):
+    db = AsyncTelegramDB(backend, CHAT_ID, scheduler=scheduler(), cache_size=options.cache_size)
+    db.prepare_datapack(User, buckets=options.buckets)
+    return await db.start()
+
+
+async def run(count: int, options):
+    random.seed(options.seed)
+    backend = MemoryBackend(seed=options.seed)
+    await populate(backend, count)
+    backend.latency, backend.jitter = options.latency, options.jitter
+    results = {}
+
+    before = rss()
+    started = time.perf_counter()
+    db = await session(backend, options)
+    results["startup_sec"] = time.perf_counter() - started
+    results["rss_per_record"] = (rss() - before) / count
+
+    started = time.perf_counter()
+    await asyncio.gather(*(db.commit(User(count + i, f"name {i}", f"new{i}")) for i in range(options.commits)))
+    results["commits_per_sec"] = options.commits / (time.perf_counter() - started)
+
+    keys = random.sample(range(count), min(count, options.commits))
+    started = time.perf_counter()
+    await asyncio.gather(*(db.commit(User(key, f"edited {key}", f"user{key}")) for key in keys))
+    results["edits_per_sec"] = len(keys) / (time.perf_counter() - started)
+
+    samples = []
+    for key in random.choices(range(count), k=options.lookups):
+        started = time.perf_counter()
+        await db.get(User(key))
+        samples.append(time.perf_counter() - started)
+    results.update({f"get_{name}_sec": value for name, value in percentiles(samples).items()})
+
+    samples = []
+    for key in random.choices(range(count), k=options.lookups):
+        started = time.perf_counter()
+        await db.find(User, username=f"user{key}")
+        samples.append(time.perf_counter() - started)
+    results.update({f"find_{name}_sec": value for name, value in percentiles(samples).items()})
+
+    started = time.perf_counter()
+    await db.get_all()
+    results["get_all_sec"] = time.perf_counter() - started
+    results["requests"] = dict(backend.requests)
+    return results
+
+
+def previous_run(path: str, params: dict):
+    if not os.path.exists(path):
+        return None
+    found = None
+    with open(path) as f:
+        for line in f:
+            run = json.loads(line)
+            if run["params"] == params:
+                found = run
+    return found
+
+
+def regressions(old: dict, new: dict, tolerance: float):
+    found = []
+    for metric, value in new.items():
+        if not isinstance(value, (int, float)) or not old.get(metric):
+            continue
+        change = value / old[metric] - 1
+        if metric in HIGHER_IS_BETTER:
+            change = -change
+        if change > tolerance:
+            found.append((metric, old[metric], value, change))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", default="10000", help="comma separated sizes of the database, e.g. 10000,100000,1000000")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every request to the simulated chat takes")
+    parser.add_argument("--jitter", type=float, default=0.0, help="maximum random seconds added to the latency")
+    parser.add_argument("--commits", type=int, default=1000, help="new datapacks committed and existing ones edited")
+    parser.add_argument("--lookups", type=int, default=1000, help="timed get and find calls")
+    parser.add_argument("--cache-size", type=int, default=None, help="cache_size of the session")
+    parser.add_argument("--buckets", type=int, default=None, help="buckets of the datapacks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.jsonl"), help="JSON lines file the results are appended to")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change of a metric reported as a regression")
+    options = parser.parse_args()
+
+    regressed = False
+    for count in (int(size) for size in options.records.split(",")):
+        params = {
+            "records": count, "latency": options.latency, "jitter": options.jitter, "commits": options.commits,
+            "lookups": options.lookups, "cache_size": options.cache_size, "buckets": options.buckets,
+        }
+        results = asyncio.run(run(count, options))
+        print(f"{count} records")
+        for metric, value in results.items():
+            if metric != "requests":
+                print(f"  {metric:<20}{value:>14.6f}")
+        old = previous_run(options.output, params)
+        if old:
+            for metric, before, after, change in regressions(old["results"], results, options.tolerance):
+                regressed = True
+                print(f"  REGRESSION {metric}: {before:.6f} -> {after:.6f} ({change:+.0%} worse)")
+        with open(options.output, "a") as f:
+            f.write(json.dumps({
+                "version": VERSION, "python": platform.python_version(), "time": time.time(),
+                "params": params, "results": results,
+            }) + "\n")
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
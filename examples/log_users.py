@@ -14,18 +14,17 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import asyncio, logging
+import logging
 from os import getenv
 from pyrogram import Client, idle, filters
 from pyrogram.types import Message
-from telegramdb import TelegramDB, DataPack, Member
+from telegramdb import AsyncTelegramDB, DataPack, Member
 
 # Creating a telegram client
 client = Client("session_name", getenv("API_ID"), getenv("API_HASH"))
-client.start()
 
-# Creating a TelegramDB instance
-SESSION = TelegramDB(client, getenv("DB_CHAT_ID"), debug=True)
+# Creating an AsyncTelegramDB instance, datapacks are loaded in main()
+SESSION = AsyncTelegramDB(client, getenv("DB_CHAT_ID"), debug=True)
 
 # Basic Logging for debugging purpose
 LOG_FORMAT = "-> [TelegramDB Example] [%(levelname)s - %(asctime)s]: %(message)s"
@@ -53,12 +52,9 @@ class User(DataPack):
 # this intialises datapack with its primary keys
 SESSION.prepare_datapack(User)
 
-# insertion lock to avoid duplicate keys 
-INSERTION_LOCK = asyncio.Lock()
-
+# commits of the same user are applied one at a time by the session, no lock is needed
 async def save_user_data(id: int, name: str, username: str):
-    async with INSERTION_LOCK:
-        SESSION.commit(User(id, name, username))
+    await SESSION.commit(User(id, name, username))
 
 # this message handler will log users to our database
 @client.on_message(group=1)
@@ -80,7 +76,7 @@ async def get_info(_, message: Message):
     else:
         user_id = message.from_user.id
     user = User(user_id)
-    if not SESSION.get(user):
+    if not await SESSION.get(user):
         await message.reply("User not found in the database.")
         return
     await message.reply(f"""
@@ -91,7 +87,10 @@ async def get_info(_, message: Message):
     **Username**: `{user.username}`
     """)
 
-def main():
-    idle()
+async def main():
+    await client.start()
+    await SESSION.start()
+    await idle()
+    await client.stop()
 
-asyncio.get_event_loop().run_until_complete(main())
\ No newline at end of file
+client.run(main())
\ No newline at end of file
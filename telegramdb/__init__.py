@@ -15,6 +15,15 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from .constants import *
+from .codec import *
+from .blob import *
+from .metrics import *
+from .schema import *
+from .backend import *
 from .database import *
+from .query import *
+from .scheduler import *
+from .snapshot import *
+from .storage import *
 
 __version__ = VERSION
\ No newline at end of file
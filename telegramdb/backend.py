@@ -0,0 +1,506 @@
+# TelegramDB
+# Copyright (C) 2023
+# Anony <github.com/anonyindian>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio, random, sys
+from collections import Counter
+from io import BytesIO
+from time import monotonic
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+from .constants import DELETE_MESSAGES_LIMIT, GET_MESSAGES_LIMIT, MESSAGE_TEXT_LIMIT
+from .exceptions import FloodWait, InvalidClient, LimitExceeded, MessageIdInvalid
+
+if TYPE_CHECKING:
+    from pyrogram import Client
+    from telethon import TelegramClient
+
+__all__ = ["Backend", "PyrogramBackend", "TelethonBackend", "MemoryBackend", "get_backend"]
+
+class Backend:
+    """
+    Base class of the backends which :class:`TelegramDB` uses to store its messages, every request made to telegram goes through one.
+
+    Note:
+        The methods are called through the :class:`Scheduler` of the session, backends don't pace or retry the requests themselves.
+    """
+    async def send(self, chat_id: Union[int, str], text: str) -> int:
+        """
+        Sends a text message.
+
+        Parameters:
+            chat_id (:obj:`int` | :obj:`str`): Target chat.
+            text (:obj:`str`): Text of the message, sent without parsing any markup.
+
+        Returns:
+            :obj:`int`: Message id of the sent message.
+        """
+        raise NotImplementedError
+
+    async def edit(self, chat_id: Union[int, str], msg_id: int, text: str):
+        """
+        Edits the text of a message, an edit which doesn't change the text is ignored. It raises :class:`MessageIdInvalid` if the message doesn't exist.
+
+        Parameters:
+            chat_id (:obj:`int` | :obj:`str`): Chat of the message.
+            msg_id (:obj:`int`): Message id of the message.
+            text (:obj:`str`): New text of the message.
+
+        Returns:
+            :obj:`None`
+        """
+        raise NotImplementedError
+
+    async def delete(self, chat_id: Union[int, str], msg_ids: List[int]):
+        """
+        Deletes messages.
+
+        Parameters:
+            chat_id (:obj:`int` | :obj:`str`): Chat of the messages.
+            msg_ids (List of :obj:`int`): Message ids, at most ``DELETE_MESSAGES_LIMIT`` of them.
+
+        Returns:
+            :obj:`None`
+        """
+        raise NotImplementedError
+
+    async def get_by_ids(self, chat_id: Union[int, str], msg_ids: List[int]) -> List[Tuple[int, Optional[str]]]:
+        """
+        Gets messages by their ids.
+
+        Parameters:
+            chat_id (:obj:`int` | :obj:`str`): Chat of the messages.
+            msg_ids (List of :obj:`int`): Message ids, at most ``GET_MESSAGES_LIMIT`` of them.
+
+        Returns:
+            A list of ``(message id, text)`` tuples, the text is ``None`` for deleted or non-text messages.
+        """
+        raise NotImplementedError
+
+    def iter_history(self, chat_id: Union[int, str], limit: int=0) -> AsyncIterator[Tuple[int, Optional[str]]]:
+        """
+        Iterates over the messages of a chat from the newest one.
+
+        Parameters:
+            chat_id (:obj:`int` | :obj:`str`): Target chat.
+            limit (:obj:`int`, Optional): Maximum number of messages, all of them if it is ``0``.
+
+        Returns:
+            An asynchronous iterator of ``(message id, text)`` tuples.
+        """
+        raise NotImplementedError
+
+    async def send_document(self, chat_id: Union[int, str], document: BytesIO) -> int:
+        """
+        Sends a file as a document.
+
+        Parameters:
+            chat_id (:obj:`int` | :obj:`str`): Target chat.
+            document (:obj:`io.BytesIO`): Content of the file, with its ``name`` set.
+
+        Returns:
+            :obj:`int`: Message id of the sent document.
+        """
+        raise NotImplementedError
+
+    async def stream_document(self, chat_id: Union[int, str], msg_id: int) -> Optional[AsyncIterator[bytes]]:
+        """
+        Gets the content of a document.
+
+        Parameters:
+            chat_id (:obj:`int` | :obj:`str`): Chat of the document.
+            msg_id (:obj:`int`): Message id of the document.
+
+        Returns:
+            An asynchronous iterator of the chunks of the document, ``None`` if the message was deleted or isn't a document.
+        """
+        raise NotImplementedError
+
+    async def create_chat(self, title: str) -> Union[int, str]:
+        """
+        Creates a new channel.
+
+        Parameters:
+            title (:obj:`str`): Title of the channel.
+
+        Returns:
+            Unique identifier of the channel.
+        """
+        raise NotImplementedError
+
+    async def resolve_chat(self, chat_id: Union[int, str]) -> int:
+        """
+        Gets the identifier of a chat that the updates of its messages come with.
+
+        Parameters:
+            chat_id (:obj:`int` | :obj:`str`): Unique identifier or username of the chat.
+
+        Returns:
+            :obj:`int`
+        """
+        raise NotImplementedError
+
+    def add_handlers(self, chat_id: int, on_message: Callable[[int, str], None], on_deleted: Callable[[int], None], group: int=-1) -> list:
+        """
+        Registers the handlers of the updates of the messages of a chat.
+
+        Parameters:
+            chat_id (:obj:`int`): Identifier returned by :meth:`Backend.resolve_chat`.
+            on_message (:obj:`Callable`): Function called with the message id and the text of every new or edited text message.
+            on_deleted (:obj:`Callable`): Function called with the message id of every deleted message.
+            group (:obj:`int`, Optional): Group of the handlers, for the clients which have them.
+
+        Returns:
+            :obj:`list`: The registered handlers, to be passed to :meth:`Backend.remove_handlers`.
+        """
+        raise NotImplementedError
+
+    def remove_handlers(self, handlers: list):
+        """
+        Unregisters the handlers returned by :meth:`Backend.add_handlers`.
+
+        Returns:
+            :obj:`None`
+        """
+        raise NotImplementedError
+
+class PyrogramBackend(Backend):
+    """
+    Backend of a :class:`pyrogram.Client`.
+
+    Parameters:
+        client (:class:`pyrogram.Client`): Telegram client.
+    """
+    def __init__(self, client: "Client"):
+        from pyrogram.enums import ParseMode
+        from pyrogram.errors import MessageIdInvalid as MessageIdInvalidError, MessageNotModified
+        self.client = client
+        self.__not_modified__ = MessageNotModified
+        self.__id_invalid__ = MessageIdInvalidError
+        self.__parse_mode__ = ParseMode.DISABLED
+
+    async def send(self, chat_id: Union[int, str], text: str):
+        message = await self.client.send_message(chat_id=chat_id, text=text, parse_mode=self.__parse_mode__)
+        return message.id
+
+    async def edit(self, chat_id: Union[int, str], msg_id: int, text: str):
+        try:
+            await self.client.edit_message_text(chat_id=chat_id, message_id=msg_id, text=text, parse_mode=self.__parse_mode__)
+        except self.__not_modified__:
+            pass
+        except self.__id_invalid__:
+            raise MessageIdInvalid(msg_id)
+
+    async def delete(self, chat_id: Union[int, str], msg_ids: List[int]):
+        await self.client.delete_messages(chat_id=chat_id, message_ids=msg_ids)
+
+    async def get_by_ids(self, chat_id: Union[int, str], msg_ids: List[int]):
+        messages = await self.client.get_messages(chat_id=chat_id, message_ids=msg_ids)
+        return [
+            (msg_id, message.text.markdown if message and not message.empty and message.text else None)
+            for msg_id, message in zip(msg_ids, messages)
+        ]
+
+    async def iter_history(self, chat_id: Union[int, str], limit: int=0):
+        async for message in self.client.get_chat_history(chat_id, limit=limit):
+            yield message.id, message.text.markdown if message.text else None
+
+    async def send_document(self, chat_id: Union[int, str], document: BytesIO):
+        message = await self.client.send_document(chat_id=chat_id, document=document)
+        return message.id
+
+    async def stream_document(self, chat_id: Union[int, str], msg_id: int):
+        message = await self.client.get_messages(chat_id=chat_id, message_ids=msg_id)
+        if not message or message.empty or not message.document:
+            return None
+        return self.client.stream_media(message)
+
+    async def create_chat(self, title: str):
+        chat = await self.client.create_channel(title)
+        return chat.id
+
+    async def resolve_chat(self, chat_id: Union[int, str]):
+        chat = await self.client.get_chat(chat_id)
+        return chat.id
+
+    def add_handlers(self, chat_id: int, on_message: Callable[[int, str], None], on_deleted: Callable[[int], None], group: int=-1):
+        from pyrogram.handlers import DeletedMessagesHandler, EditedMessageHandler, MessageHandler
+
+        async def message_handler(_, message):
+            if message.chat and message.chat.id == chat_id and message.text:
+                on_message(message.id, message.text.markdown)
+
+        async def deleted_handler(_, messages):
+            for message in messages:
+                # deletes outside of channels come without a chat, their ids are unique for the account
+                if message.chat is None or message.chat.id == chat_id:
+                    on_deleted(message.id)
+
+        handlers = [(MessageHandler(message_handler), group), (EditedMessageHandler(message_handler), group), (DeletedMessagesHandler(deleted_handler), group)]
+        for handler, _ in handlers:
+            self.client.add_handler(handler, group)
+        return handlers
+
+    def remove_handlers(self, handlers: list):
+        for handler, group in handlers:
+            self.client.remove_handler(handler, group)
+
+class TelethonBackend(Backend):
+    """
+    Backend of a :class:`telethon.TelegramClient`.
+
+    Parameters:
+        client (:class:`telethon.TelegramClient`): Telegram client.
+    """
+    def __init__(self, client: "TelegramClient"):
+        from telethon.errors import MessageIdInvalidError, MessageNotModifiedError
+        self.client = client
+        self.__not_modified__ = MessageNotModifiedError
+        self.__id_invalid__ = MessageIdInvalidError
+
+    async def send(self, chat_id: Union[int, str], text: str):
+        message = await self.client.send_message(entity=chat_id, message=text, parse_mode=None)
+        return message.id
+
+    async def edit(self, chat_id: Union[int, str], msg_id: int, text: str):
+        try:
+            await self.client.edit_message(entity=chat_id, message=msg_id, text=text, parse_mode=None)
+        except self.__not_modified__:
+            pass
+        except self.__id_invalid__:
+            raise MessageIdInvalid(msg_id)
+
+    async def delete(self, chat_id: Union[int, str], msg_ids: List[int]):
+        await self.client.delete_messages(entity=chat_id, message_ids=msg_ids)
+
+    async def get_by_ids(self, chat_id: Union[int, str], msg_ids: List[int]):
+        messages = await self.client.get_messages(chat_id, ids=msg_ids)
+        return [(msg_id, message.message if message and message.message else None) for msg_id, message in zip(msg_ids, messages)]
+
+    async def iter_history(self, chat_id: Union[int, str], limit: int=0):
+        async for message in self.client.iter_messages(chat_id, limit=limit or None):
+            yield message.id, message.message or None
+
+    async def send_document(self, chat_id: Union[int, str], document: BytesIO):
+        message = await self.client.send_file(entity=chat_id, file=document, force_document=True)
+        return message.id
+
+    async def stream_document(self, chat_id: Union[int, str], msg_id: int):
+        message = await self.client.get_messages(chat_id, ids=msg_id)
+        if not message or not message.document:
+            return None
+        return self.client.iter_download(message.media)
+
+    async def create_chat(self, title: str):
+        from telethon import functions
+        result = await self.client(functions.channels.CreateChannelRequest(
+            title=title,
+            about="Channel to store DataPacks",
+            broadcast=True,
+        ))
+        return result.__dict__["chats"][0].__dict__["id"]
+
+    async def resolve_chat(self, chat_id: Union[int, str]):
+        return await self.client.get_peer_id(chat_id)
+
+    def add_handlers(self, chat_id: int, on_message: Callable[[int, str], None], on_deleted: Callable[[int], None], group: int=-1):
+        from telethon import events
+
+        async def message_handler(event):
+            if event.message.message:
+                on_message(event.message.id, event.message.message)
+
+        async def deleted_handler(event):
+            if event.chat_id is None or event.chat_id == chat_id:
+                for msg_id in event.deleted_ids:
+                    on_deleted(msg_id)
+
+        handlers = [(message_handler, events.NewMessage(chats=chat_id)), (message_handler, events.MessageEdited(chats=chat_id)), (deleted_handler, events.MessageDeleted())]
+        for callback, event in handlers:
+            self.client.add_event_handler(callback, event)
+        return handlers
+
+    def remove_handlers(self, handlers: list):
+        for callback, _ in handlers:
+            self.client.remove_event_handler(callback)
+
+class MemoryBackend(Backend):
+    """
+    In-process fake of telegram which keeps the chats in memory, it is meant for tests and benchmarks run without a network.
+
+    Note:
+        Chats are created on their first request, message ids start from ``1`` in every chat like in channels.
+        Every session using the same backend sees the same chats, the updates of the messages are delivered to their handlers on the next iteration of the event loop.
+
+    Parameters:
+        latency (:obj:`float`, Optional): Seconds every request takes.
+        jitter (:obj:`float`, Optional): Maximum random seconds added to the latency of a request.
+        flood_rate (:obj:`float`, Optional): Writes per second accepted by a chat before :class:`FloodWait` is raised, unlimited if not provided.
+        flood_burst (:obj:`int`, Optional): Writes accepted by a chat at once before the flood rate applies.
+        text_limit (:obj:`int`, Optional): Maximum characters of a text message.
+        seed (:obj:`int`, Optional): Seed of the random jitter.
+
+    Attributes:
+        chats (:obj:`dict`): Messages of every chat mapped by their id, as ``(text, document)`` tuples.
+        requests (:obj:`collections.Counter`): Number of requests made of every method.
+
+    Example:
+        .. code-block:: python
+
+            from telegramdb import AsyncTelegramDB, MemoryBackend
+
+            backend = MemoryBackend(latency=0.05, flood_rate=1, flood_burst=20)
+            SESSION = await AsyncTelegramDB(backend, -1).start()
+    """
+    def __init__(self, latency: float=0.0, jitter: float=0.0, flood_rate: float=None, flood_burst: int=20, text_limit: int=MESSAGE_TEXT_LIMIT, seed: int=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.flood_burst = flood_burst
+        self.text_limit = text_limit
+        self.chats: Dict[Union[int, str], Dict[int, tuple]] = {}
+        self.requests: Counter = Counter()
+        self.__last_ids__: Dict[Union[int, str], int] = {}
+        self.__tokens__: Dict[Union[int, str], Tuple[float, float]] = {}
+        self.__handlers__: Dict[Union[int, str], list] = {}
+        self.__random__ = random.Random(seed)
+        self.__next_chat__ = -1000000000000
+
+    async def __request__(self, method: str, chat_id: Union[int, str]=None, write: bool=False):
+        self.requests[method] += 1
+        if write and self.flood_rate is not None:
+            now = monotonic()
+            tokens, updated = self.__tokens__.get(chat_id, (float(self.flood_burst), now))
+            tokens = min(self.flood_burst, tokens + (now - updated) * self.flood_rate)
+            if tokens < 1:
+                self.__tokens__[chat_id] = (tokens, now)
+                raise FloodWait((1 - tokens) / self.flood_rate)
+            self.__tokens__[chat_id] = (tokens - 1, now)
+        delay = self.latency + (self.__random__.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        return self.chats.setdefault(chat_id, {}) if chat_id is not None else None
+
+    def __new_id__(self, chat_id: Union[int, str]):
+        self.__last_ids__[chat_id] = self.__last_ids__.get(chat_id, 0) + 1
+        return self.__last_ids__[chat_id]
+
+    def __notify__(self, chat_id: Union[int, str], index: int, *args):
+        loop = asyncio.get_event_loop()
+        for handlers in self.__handlers__.get(chat_id, ()):
+            loop.call_soon(handlers[index], *args)
+
+    def __check_text__(self, text: str):
+        if len(text) > self.text_limit:
+            raise LimitExceeded("characters", len(text), self.text_limit)
+
+    async def send(self, chat_id: Union[int, str], text: str):
+        self.__check_text__(text)
+        messages = await self.__request__("send", chat_id, write=True)
+        msg_id = self.__new_id__(chat_id)
+        messages[msg_id] = (text, None)
+        self.__notify__(chat_id, 0, msg_id, text)
+        return msg_id
+
+    async def edit(self, chat_id: Union[int, str], msg_id: int, text: str):
+        self.__check_text__(text)
+        messages = await self.__request__("edit", chat_id, write=True)
+        if msg_id not in messages or messages[msg_id][0] is None:
+            raise MessageIdInvalid(msg_id)
+        if messages[msg_id][0] != text:
+            messages[msg_id] = (text, None)
+            self.__notify__(chat_id, 0, msg_id, text)
+
+    async def delete(self, chat_id: Union[int, str], msg_ids: List[int]):
+        if len(msg_ids) > DELETE_MESSAGES_LIMIT:
+            raise LimitExceeded("messages", len(msg_ids), DELETE_MESSAGES_LIMIT)
+        messages = await self.__request__("delete", chat_id, write=True)
+        for msg_id in msg_ids:
+            if messages.pop(msg_id, None) is not None:
+                self.__notify__(chat_id, 1, msg_id)
+
+    async def get_by_ids(self, chat_id: Union[int, str], msg_ids: List[int]):
+        if len(msg_ids) > GET_MESSAGES_LIMIT:
+            raise LimitExceeded("messages", len(msg_ids), GET_MESSAGES_LIMIT)
+        messages = await self.__request__("get_by_ids", chat_id)
+        return [(msg_id, messages.get(msg_id, (None,))[0]) for msg_id in msg_ids]
+
+    async def iter_history(self, chat_id: Union[int, str], limit: int=0):
+        messages = await self.__request__("iter_history", chat_id)
+        msg_ids = sorted(messages, reverse=True)
+        for msg_id in msg_ids[:limit] if limit else msg_ids:
+            if msg_id in messages:
+                yield msg_id, messages[msg_id][0]
+
+    async def send_document(self, chat_id: Union[int, str], document: BytesIO):
+        messages = await self.__request__("send_document", chat_id, write=True)
+        msg_id = self.__new_id__(chat_id)
+        messages[msg_id] = (None, document.getvalue())
+        return msg_id
+
+    async def stream_document(self, chat_id: Union[int, str], msg_id: int):
+        messages = await self.__request__("stream_document", chat_id)
+        document = messages.get(msg_id, (None, None))[1]
+        if document is None:
+            return None
+
+        async def stream():
+            for i in range(0, len(document), 512 * 1024):
+                yield document[i:i + 512 * 1024]
+        return stream()
+
+    async def create_chat(self, title: str):
+        await self.__request__("create_chat")
+        self.__next_chat__ -= 1
+        self.chats[self.__next_chat__] = {}
+        return self.__next_chat__
+
+    async def resolve_chat(self, chat_id: Union[int, str]):
+        await self.__request__("resolve_chat", chat_id)
+        return chat_id
+
+    def add_handlers(self, chat_id: int, on_message: Callable[[int, str], None], on_deleted: Callable[[int], None], group: int=-1):
+        handlers = [(chat_id, on_message, on_deleted)]
+        self.__handlers__.setdefault(chat_id, []).append(handlers[0][1:])
+        return handlers
+
+    def remove_handlers(self, handlers: list):
+        for chat_id, on_message, on_deleted in handlers:
+            self.__handlers__[chat_id].remove((on_message, on_deleted))
+
+def _is_client(client, module: str, name: str):
+    # a client of a library which isn't imported can't exist, so it is never imported here
+    library = sys.modules.get(module)
+    return library is not None and isinstance(client, getattr(library, name))
+
+def get_backend(client: Union["Client", "TelegramClient", Backend]):
+    """
+    Returns the :class:`Backend` of a telegram client.
+
+    Note:
+        Pyrogram and telethon are only imported by the backend of their own clients.
+
+    Parameters:
+        client (:class:`pyrogram.Client` | :class:`telethon.TelegramClient` | :class:`Backend`): Telegram client, a backend is returned as it is.
+
+    Returns:
+        :class:`Backend`
+    """
+    if isinstance(client, Backend):
+        return client
+    if _is_client(client, "pyrogram", "Client"):
+        return PyrogramBackend(client)
+    if _is_client(client, "telethon", "TelegramClient"):
+        return TelethonBackend(client)
+    raise InvalidClient()
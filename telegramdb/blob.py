@@ -0,0 +1,100 @@
+# TelegramDB
+# Copyright (C) 2023
+# Anony <github.com/anonyindian>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import hashlib, zlib
+from typing import Any, Optional
+from .codec import Codec, decode_data, encode_data
+from .constants import BLOB_PREFIX
+
+__all__ = ["Blob"]
+
+class Blob:
+    """
+    Reference to a value of a :class:`DataPack` stored in a compressed document of the database chat.
+
+    Note:
+        The largest values of a datapack are stored as blobs when its message would exceed ``MESSAGE_TEXT_LIMIT`` characters, only their reference is loaded on start.
+        :meth:`TelegramDB.get`, :meth:`TelegramDB.get_all` and :meth:`TelegramDB.find` download the values, queries return the references.
+
+    Parameters:
+        msg_id (:obj:`int`): Message id of the document.
+        digest (:obj:`str`): Digest of the compressed value, a value which didn't change isn't uploaded again.
+    """
+    __slots__ = ("msg_id", "digest")
+
+    def __init__(self, msg_id: int, digest: str):
+        self.msg_id = msg_id
+        self.digest = digest
+
+    def __eq__(self, other):
+        return isinstance(other, Blob) and (self.msg_id, self.digest) == (other.msg_id, other.digest)
+
+    def __hash__(self):
+        return hash((self.msg_id, self.digest))
+
+    def __repr__(self):
+        return f"Blob(msg_id={self.msg_id}, digest='{self.digest}')"
+
+    def to_text(self):
+        """
+        Returns the reference written in the message of the datapack in place of the value.
+        """
+        return f"{BLOB_PREFIX}{self.msg_id}:{self.digest}"
+
+    @classmethod
+    def from_text(cls, text: Any) -> Optional["Blob"]:
+        """
+        Returns the blob of a reference written by :meth:`Blob.to_text`, ``None`` if the value isn't a reference.
+        """
+        if not isinstance(text, str) or not text.startswith(BLOB_PREFIX):
+            return None
+        msg_id, digest = text[len(BLOB_PREFIX):].split(":", 1)
+        return cls(int(msg_id), digest)
+
+def dump_blobs(data: dict):
+    """
+    Returns a copy of the data of a :class:`DataPack` with the references of its blobs in place of the :class:`Blob` objects.
+    """
+    if not any(isinstance(value, Blob) for value in data.values()):
+        return data
+    return {key: value.to_text() if isinstance(value, Blob) else value for key, value in data.items()}
+
+def load_blobs(data: dict):
+    """
+    Replaces the references of the blobs in the data of a :class:`DataPack` with :class:`Blob` objects.
+    """
+    for key, value in data.items():
+        blob = Blob.from_text(value)
+        if blob is not None:
+            data[key] = blob
+    return data
+
+def compress_value(value: Any, codec: Codec):
+    """
+    Serializes a value with the given codec and compresses it.
+
+    Returns:
+        :obj:`tuple`: Compressed bytes and their digest.
+    """
+    payload = zlib.compress(encode_data({"value": value}, codec).encode())
+    return payload, hashlib.sha1(payload).hexdigest()[:16]
+
+def decode_value(payload: bytes):
+    """
+    Deserializes a value decompressed from a blob.
+    """
+    return decode_data(payload.decode())["value"]
@@ -0,0 +1,144 @@
+# TelegramDB
+# Copyright (C) 2023
+# Anony <github.com/anonyindian>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+from ast import literal_eval
+from typing import Dict
+from .constants import CODEC_TAG_PREFIX
+from .exceptions import UnknownCodec
+
+__all__ = ["Codec", "ReprCodec", "JSONCodec", "register_codec", "encode_data", "decode_data"]
+
+class Codec:
+    """
+    Base class of the codecs which serialize the data of a :class:`DataPack` in the text of a message.
+
+    Note:
+        Subclasses must be registered with :func:`register_codec` to be readable while loading the database chat.
+
+    Attributes:
+        tag (:obj:`str`): Unique name and version of the format, written before the payload of every message.
+    """
+    tag: str
+
+    def encode(self, data: dict) -> str:
+        """
+        Serializes the data of a :class:`DataPack`.
+
+        Parameters:
+            data (:obj:`dict`): Data to be serialized.
+
+        Returns:
+            :obj:`str`
+        """
+        raise NotImplementedError
+
+    def decode(self, payload: str) -> dict:
+        """
+        Deserializes the data of a :class:`DataPack`.
+
+        Parameters:
+            payload (:obj:`str`): Payload written by :meth:`Codec.encode`.
+
+        Returns:
+            :obj:`dict`
+        """
+        raise NotImplementedError
+
+class ReprCodec(Codec):
+    """
+    Legacy format which stores the ``repr`` of the data and reads it with ``ast.literal_eval``, any python literal can be stored.
+
+    Note:
+        The payload is written without a tag, so messages written by older versions of TelegramDB are read with this codec.
+    """
+    tag = ""
+
+    def encode(self, data: dict) -> str:
+        return repr(data)
+
+    def decode(self, payload: str) -> dict:
+        return literal_eval(payload)
+
+class JSONCodec(Codec):
+    """
+    Compact JSON format, it is the default one.
+
+    Note:
+        JSON keeps only its own types: tuples are loaded back as lists and the keys of nested dicts as strings.
+        Data which can't be stored as JSON at all (e.g. bytes or sets) is written with :class:`ReprCodec`.
+    """
+    tag = "j1"
+
+    def encode(self, data: dict) -> str:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    def decode(self, payload: str) -> dict:
+        return json.loads(payload)
+
+CODECS: Dict[str, Codec] = {}
+
+def register_codec(codec: Codec):
+    """
+    Use this function to make a custom :class:`Codec` readable while loading the database chat.
+
+    Parameters:
+        codec (:class:`Codec`): Codec to be registered by its tag.
+
+    Returns:
+        :obj:`None`
+    """
+    CODECS[codec.tag] = codec
+
+register_codec(ReprCodec())
+register_codec(JSONCodec())
+
+def encode_data(data: dict, codec: Codec) -> str:
+    """
+    Serializes the data of a :class:`DataPack` with the given codec, prefixed by the tag of the codec.
+
+    Parameters:
+        data (:obj:`dict`): Data to be serialized.
+        codec (:class:`Codec`): Codec to be used.
+
+    Returns:
+        :obj:`str`
+    """
+    try:
+        payload = codec.encode(data)
+    except (TypeError, ValueError):
+        codec = CODECS[ReprCodec.tag]
+        payload = codec.encode(data)
+    if not codec.tag:
+        return payload
+    return f"{CODEC_TAG_PREFIX}{codec.tag} {payload}"
+
+def decode_data(text: str) -> dict:
+    """
+    Deserializes the data of a :class:`DataPack` with the codec of its tag, untagged text is read with :class:`ReprCodec`.
+
+    Parameters:
+        text (:obj:`str`): Text written by :func:`encode_data`.
+
+    Returns:
+        :obj:`dict`
+    """
+    if not text.startswith(CODEC_TAG_PREFIX):
+        return CODECS[ReprCodec.tag].decode(text)
+    tag, payload = text[len(CODEC_TAG_PREFIX):].split(" ", 1)
+    if tag not in CODECS:
+        raise UnknownCodec(tag)
+    return CODECS[tag].decode(payload)
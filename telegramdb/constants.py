@@ -16,4 +16,20 @@
 
 DP_NAME_SEPARATOR = '::'
 
+DP_BUCKET_SEPARATOR = '##'
+
+CODEC_TAG_PREFIX = '@'
+
+BLOB_PREFIX = '@telegramdb/blob:'
+
+DELETE_MESSAGES_LIMIT = 100
+
+GET_MESSAGES_LIMIT = 200
+
+KEY_LOCK_STRIPES = 256
+
+MESSAGE_TEXT_LIMIT = 4096
+
+SNAPSHOT_CHUNK_SIZE = 1000
+
 VERSION = "1.0.0"
\ No newline at end of file
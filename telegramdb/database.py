@@ -14,16 +14,152 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import inspect, asyncio, nest_asyncio
+import asyncio, json, os, threading, zlib
+from io import BytesIO
 from logging import Logger, getLogger
-from ast import literal_eval
-from telethon import TelegramClient
-from pyrogram import Client
-from typing import Union, List
-from .constants import DP_NAME_SEPARATOR, VERSION
-from .exceptions import InvalidClient, InvalidDataPack, ReservedCharacter
+from typing import TYPE_CHECKING, Callable, Iterable, Optional, TextIO, Union, List
+from concurrent.futures import Executor
+from functools import wraps
+from itertools import islice
+from .constants import DELETE_MESSAGES_LIMIT, DP_BUCKET_SEPARATOR, DP_NAME_SEPARATOR, GET_MESSAGES_LIMIT, KEY_LOCK_STRIPES, MESSAGE_TEXT_LIMIT, SNAPSHOT_CHUNK_SIZE, VERSION
+from .exceptions import EvictedDataPack, MessageIdInvalid, ReservedCharacter, UniqueViolation, UnpreparedDataPack
+from .backend import Backend, get_backend
+from .blob import Blob, compress_value, decode_value, dump_blobs, load_blobs
+from .index import HashIndex, SortedIndex
+from .schema import MISSING, Schema
+from .metrics import Metrics, instrumented
+from .query import Query
+from .codec import Codec, JSONCodec, ReprCodec, decode_data, encode_data
+from .scheduler import Scheduler, get_flood_wait, is_transient
+from .snapshot import Snapshot
+from .storage import Partition, Record, Store
 
-nest_asyncio.apply()
+if TYPE_CHECKING:
+    from pyrogram import Client
+    from telethon import TelegramClient
+
+def _parse_datapacks(messages: List[tuple]):
+    """
+    Parses the text messages of the telegram database chat.
+
+    Parameters:
+        messages (List of :obj:`tuple`): ``(message id, text)`` tuples.
+
+    Note:
+        A page is parsed in a tuple for every datapack stored in it, named as if it had its own message.
+
+    Returns:
+        A list of ``(message id, text, name, data)`` tuples, name and data are ``None`` for invalid messages.
+    """
+    parsed = []
+    for msg_id, text in messages:
+        try:
+            name, data = text.split("\n", 1)
+            name, data = name[1:], decode_data(data)
+            if DP_BUCKET_SEPARATOR in name:
+                type_name = name.split(DP_BUCKET_SEPARATOR, 1)[0]
+                parsed.extend([(msg_id, text, f"{type_name}{DP_NAME_SEPARATOR}{key}", load_blobs(value)) for key, value in data.items()])
+            else:
+                parsed.append((msg_id, text, name, load_blobs(data)))
+        except Exception:
+            parsed.append((msg_id, text, None, None))
+    return parsed
+
+def _parse_page(text: str):
+    """
+    Parses the name of a page from the text of its message.
+
+    Parameters:
+        text (:obj:`str`): Text of the message.
+
+    Returns:
+        :obj:`tuple`: Name of the page and its bucket, ``None`` if the message isn't a page.
+    """
+    name = text[1:text.find("\n")]
+    if DP_BUCKET_SEPARATOR not in name:
+        return None
+    return name, int(name.rsplit(DP_BUCKET_SEPARATOR, 1)[1])
+
+def _dump_line(name: str, data: dict):
+    """
+    Serializes a datapack in a line of an export.
+
+    Parameters:
+        name (:obj:`str`): Name of the type of the datapack.
+        data (:obj:`dict`): Data of the datapack.
+
+    Note:
+        Data which can't be stored as JSON is written in ``text`` with :class:`ReprCodec`.
+
+    Returns:
+        :obj:`str`
+    """
+    try:
+        return json.dumps({"type": name, "data": data}, ensure_ascii=False, separators=(",", ":")) + "\n"
+    except (TypeError, ValueError):
+        return json.dumps({"type": name, "text": encode_data(data, ReprCodec())}, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+def _load_line(line: str):
+    """
+    Parses a line written by :func:`_dump_line`.
+
+    Parameters:
+        line (:obj:`str`): Line of the export.
+
+    Returns:
+        :obj:`tuple`: Name of the type and data of the datapack.
+    """
+    entry = json.loads(line)
+    return entry["type"], entry["data"] if "data" in entry else decode_data(entry["text"])
+
+def _is_retryable(error: BaseException):
+    """
+    Returns whether a write of the write-behind queue which failed with the error should be queued again, e.g. after a network failure or while the flush is cancelled.
+    """
+    return isinstance(error, asyncio.CancelledError) or is_transient(error) or get_flood_wait(error) is not None
+
+def _running_loop():
+    """
+    Returns the event loop running in the current thread, ``None`` if there is none.
+    """
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+def _on_session_loop(function: Callable):
+    """
+    Decorator which runs a coroutine method of :class:`AsyncTelegramDB` on the event loop of the session, it is submitted to that loop when it is awaited from another thread or event loop.
+    """
+    @wraps(function)
+    async def wrapper(self, *args, **kwargs):
+        loop = self.__loop__
+        if loop.is_running() and _running_loop() is not loop:
+            return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(function(self, *args, **kwargs), loop))
+        return await function(self, *args, **kwargs)
+    return wrapper
+
+class _HeldLocks:
+    """
+    Stripes of the lock table of a session held by a write, they are acquired in order so two writes never wait for each other.
+    """
+    def __init__(self, locks: List[asyncio.Lock]):
+        self.__locks__ = locks
+
+    async def __aenter__(self):
+        acquired = []
+        try:
+            for lock in self.__locks__:
+                await lock.acquire()
+                acquired.append(lock)
+        except BaseException:
+            for lock in reversed(acquired):
+                lock.release()
+            raise
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        for lock in reversed(self.__locks__):
+            lock.release()
 
 class Member:
     """
@@ -32,6 +168,13 @@ class Member:
     Parameters:
         _ (:obj:`type`): Datatype of the member. 
         is_primary (:obj:`bool`): Whether the member is a primary key or not.
+        index (:obj:`bool`, Optional): Whether the member is indexed or not, indexed members can be used to find datapacks with :meth:`TelegramDB.find`.
+        unique (:obj:`bool`, Optional): Whether the member is indexed and its values must be unique or not.
+        ordered (:obj:`bool`, Optional): Whether the member is indexed in order or not, ordered members can be used to sort and scan ranges of datapacks with :meth:`TelegramDB.query`. The primary key can be ordered too.
+        default (:obj:`Any`, Optional): Value stored when the member isn't set.
+
+    Note:
+        Values are checked against the datatype when the datapack is committed, see :class:`Schema` for the datatypes which are converted.
 
     Example:
         .. code-block:: python
@@ -43,17 +186,56 @@ class Member:
             
             # text of type str
             text = Member(str)
+
+            # username of type str which can't be shared by two datapacks
+            username = Member(str, unique=True)
+
+            # creation date, converted back to a datetime when loaded
+            created = Member(datetime, default=None)
+
+            # score which datapacks can be sorted and paginated by
+            score = Member(int, ordered=True)
     """
-    def __init__(self, _:type, is_primary:bool=False):
+    def __init__(self, _:type, is_primary:bool=False, index:bool=False, unique:bool=False, default=MISSING, ordered:bool=False):
+        self.name: str = None
+        self.type = _
+        self.default = default
         self.is_primary = is_primary
+        self.index = index or unique or ordered
+        self.unique = unique
+        self.ordered = ordered
         return
 
-class DataPack:
+class DataPackMeta(type):
+    """
+    Metaclass of :class:`DataPack`, it collects the :class:`Member` attributes of a class in ``__members__``, replaces them with ``__slots__`` and compiles the :class:`Schema` of the class in ``__schema__``.
+    """
+    def __new__(mcs, name: str, bases: tuple, namespace: dict):
+        members = {}
+        for base in reversed(bases):
+            members.update(getattr(base, "__members__", {}))
+        slots = list(namespace.get("__slots__", ()))
+        for key, value in list(namespace.items()):
+            if isinstance(value, Member):
+                value.name = key
+                members[key] = namespace.pop(key)
+                if key not in slots:
+                    slots.append(key)
+        namespace["__slots__"] = tuple(slots)
+        namespace["__members__"] = members
+        cls = super().__new__(mcs, name, bases, namespace)
+        cls.__schema__ = Schema(cls)
+        cls.__get_dict__ = cls.__schema__.get_dict
+        cls.__set_dict__ = cls.__schema__.set_dict
+        return cls
+
+class DataPack(metaclass=DataPackMeta):
     """
     Object that contains all the data in a database.
 
     Note:
         Members are added as attributes in an inherited class of this object. 
+        Instances have a slot for every member instead of a ``__dict__``, add ``__slots__ = ("__dict__",)`` to the class to set other attributes too.
 
     Attributes:
         __datapack_name__ (:obj:`str`): Name of the :class:`DataPack`.
@@ -71,31 +253,51 @@ class DataPack:
                 def __init__(self, id):
                     self.id = id
     """
+    __slots__ = ()
     __datapack_name__:str
+    __schema__: Schema
 
-    def __get_dict__(self):
-        __dict_to_return = dict(self.__dict__)
-        if '__datapack_name__' in __dict_to_return:
-            __dict_to_return.pop('__datapack_name__')
-        return __dict_to_return
-    
     def __query_data__(self):
         return f"{self.__datapack_name__} - {self.__get_dict__()}"
 
-class TelegramDB:
+class _DynamicDataPack(DataPack):
     """
-    Main object which initialises the telegram database session.
+    :class:`DataPack` with a ``__dict__``, returned by :meth:`TelegramDB.get_all` for the types which are not prepared.
+    """
+    __slots__ = ("__dict__",)
+
+class AsyncTelegramDB:
+    """
+    Asynchronous telegram database session, every database operation is a coroutine which awaits the telegram client directly.
+
+    Note:
+        The datapacks are not loaded until :meth:`AsyncTelegramDB.start` is awaited.
+        The session belongs to the event loop which started it, its operations awaited from another thread or event loop are run on that loop while it is running.
+        Writes of the same primary key are applied one at a time, writes of different keys run concurrently, except for the keys of the same bucket of a type with buckets.
 
     Parameters:
-        telegram_client (:class:`pyrogram.Client` | :class:`telethon.TelegramClient`): Telegram client which will be used to save database queries on telegram.
+        telegram_client (:class:`pyrogram.Client` | :class:`telethon.TelegramClient` | :class:`Backend`): Telegram client which will be used to save database queries on telegram, or a :class:`Backend` such as :class:`MemoryBackend`.
         chat_id (:obj:`int` | :obj:`str`): Unique identifier for the target chat or username of the target channel (in the format ``@channelusername``).
         debug (:obj:`bool`, Optional): Database queries will be debugged if it is set to ``True``.
         logger (:class:`logging.Logger`, Optional): Logger which will be used for debugging.
+        write_behind (:obj:`bool`, Optional): Commits and deletes are applied to the cache immediately and published on telegram in the background if it is set to ``True``.
+        flush_interval (:obj:`float`, Optional): Seconds between two background flushes of the write-behind queue.
+        max_queue_size (:obj:`int`, Optional): Maximum number of pending writes, the queue is flushed before accepting more.
+        scheduler (:class:`Scheduler`, Optional): Scheduler which paces and retries the requests sent to telegram, a new one is used if not provided.
+        snapshot (:obj:`str` | :class:`Snapshot`, Optional): Path of a local snapshot of the database chat, only the messages newer than the snapshot are loaded from telegram on start.
+        verify_snapshot (:obj:`bool`, Optional): Messages of the snapshot are checked for edits and deletes on start, which fetches them again in chunks. Set it to ``False`` to load only the messages newer than the snapshot, when no other session edits or deletes the datapacks while this one is stopped, otherwise their edits and deletes are missed.
+        load_concurrency (:obj:`int`, Optional): Maximum number of windows of messages fetched at the same time while loading the database chat.
+        executor (:class:`concurrent.futures.Executor`, Optional): Executor used to parse the loaded messages, e.g. a :class:`concurrent.futures.ProcessPoolExecutor`. They are parsed on the event loop if not provided.
+        progress (:obj:`Callable`, Optional): Function called with the number of completed and total windows of messages while loading the database chat.
+        codec (:class:`Codec`, Optional): Codec used to write the data in the messages, :class:`JSONCodec` if not provided. Messages written with any registered codec are readable.
+        cache_size (:obj:`int`, Optional): Maximum number of datapacks of every type kept in memory, the least recently used ones are evicted and fetched again by their message id when needed. All of them are kept if not provided.
+        cache_ttl (:obj:`float`, Optional): Seconds after which a cached datapack is evicted, they don't expire if not provided.
+        metrics (:class:`Metrics`, Optional): Registry in which the latency of the operations, the requests sent to telegram and the cache hits are recorded, nothing is recorded if not provided.
     
     Example:
         .. code-block:: python
 
-            from telegramdb import TelegramDB
+            from telegramdb import AsyncTelegramDB
             from pyrogram import Client
 
             client = Client(
@@ -103,12 +305,12 @@ class TelegramDB:
                 api_id=12345,
                 api_hash="0123456789abcdef0123456789abcdef"
             )
-            chat_id = 777000
-            SESSION = TelegramDB(client, chat_id)
+
+            async def main():
+                await client.start()
+                SESSION = await AsyncTelegramDB(client, 777000).start()
     """
-    __datapacks__:dict = {str:{"id":int, "data":str}}
-    __dp_cache__:dict = {}  
-    def __init__(self, telegram_client: Union[Client, TelegramClient], chat_id: Union[int, str]=None, debug: bool=False, logger: Logger=None):
+    def __init__(self, telegram_client: Union["Client", "TelegramClient", Backend], chat_id: Union[int, str]=None, debug: bool=False, logger: Logger=None, write_behind: bool=False, flush_interval: float=1.0, max_queue_size: int=1000, scheduler: Scheduler=None, snapshot: Union[str, Snapshot]=None, verify_snapshot: bool=True, load_concurrency: int=4, executor: Executor=None, progress: Callable[[int, int], None]=None, codec: Codec=None, cache_size: int=None, cache_ttl: float=None, metrics: Metrics=None):
         print(f"""
     TelegramDB v{VERSION} Copyright (C) 2023 anonyindian
     This program comes with ABSOLUTELY NO WARRANTY.
@@ -116,289 +318,2171 @@ class TelegramDB:
     under certain conditions.
             """)
         self.debug = debug
-        self.__telegram_client__ = telegram_client
-        self.__loop__ = asyncio.get_event_loop()
-
-        if chat_id:
-            self.__chat_id__ = chat_id
-            self.__get_datapacks__()
-        else:
-            self.__make_chat__()
+        self.__backend__ = get_backend(telegram_client)
+        self.__chat_id__ = chat_id
+        self.__loop__ = getattr(telegram_client, "loop", None) or asyncio.get_event_loop()
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.__pending__: dict = {}
+        self.__pending_deletes__: set = set()
+        self.__pending_pages__: set = set()
+        self.__flusher__: asyncio.Task = None
+        self.__flush_lock__ = asyncio.Lock()
+        self.__flush_error__: Optional[Exception] = None
+        self.__key_locks__ = [asyncio.Lock() for _ in range(KEY_LOCK_STRIPES)]
+        self.__scheduler__ = scheduler or Scheduler()
+        self.__snapshot__ = Snapshot(snapshot) if isinstance(snapshot, str) else snapshot
+        self.verify_snapshot = verify_snapshot
+        self.load_concurrency = load_concurrency
+        self.progress = progress
+        self.invalid_messages: List[int] = []
+        self.__executor__ = executor
+        self.__codec__ = codec or JSONCodec()
+        self.__store__ = Store(cache_size, cache_ttl)
+        self.__top_id__ = 0
+        self.__handlers__: list = []
+        self.__handlers_group__ = -1
+        self.metrics = metrics
+        if metrics is not None:
+            if self.__scheduler__.metrics is None:
+                self.__scheduler__.metrics = metrics
+            metrics.gauge("telegramdb_datapacks", lambda: len(self.__store__))
+            metrics.gauge("telegramdb_pending_writes", lambda: len(self.__pending__) + len(self.__pending_deletes__) + len(self.__pending_pages__))
 
         if debug:
             if not logger:
                 self.LOGGER = getLogger()
             else:
                 self.LOGGER = logger
+
+    async def start(self):
+        """
+        Use this method to load the existing datapacks from the database chat, the chat is created if no ``chat_id`` was provided.
+
+        Returns:
+            :class:`AsyncTelegramDB`
+        """
+        # the session belongs to the loop which started it
+        self.__loop__ = asyncio.get_event_loop()
+        if self.__chat_id__:
+            await self.__get_datapacks__()
+        else:
+            await self.__make_chat__()
+        return self
     
-    def prepare_datapack(self, datapack_class: DataPack):
+    @_on_session_loop
+    async def subscribe(self, group: int=-1):
+        """
+        Use this method to keep the session in sync with the other sessions of the same database chat, the new, edited and deleted messages of the chat are applied to the cache as they come.
+
+        Note:
+            The messages sent to the chat since the session was started are loaded first, edits and deletes done in the meantime are not.
+            Datapacks with a pending write of the write-behind queue aren't changed by the updates.
+
+        Parameters:
+            group (:obj:`int`, Optional): Group of the handlers of a :class:`pyrogram.Client`, a group of their own lets them run along the handlers of the bot.
+
+        Returns:
+            :obj:`None`
+
+        Example:
+            .. code-block:: python
+
+                SESSION = await AsyncTelegramDB(client, chat_id).start()
+                await SESSION.subscribe()
+        """
+        if self.__handlers__:
+            return
+        chat_id = await self.__scheduler__.read(self.__chat_id__, self.__backend__.resolve_chat, self.__chat_id__)
+        self.__handlers__ = self.__backend__.add_handlers(chat_id, self.__apply_update__, lambda msg_id: self.__apply_update__(msg_id, None), group)
+        self.__handlers_group__ = group
+        await self.__catch_up__()
+
+    async def __catch_up__(self):
+        """
+        This method is used to load the messages sent to the telegram database chat since the session was started or last caught up.
+
+        Returns:
+            :obj:`None`
+        """
+        top_id = await self.__get_top_id__()
+        if top_id > self.__top_id__:
+            if self.__snapshot__:
+                self.__snapshot__.begin_load(top_id)
+            await self.__load_history__(self.__top_id__, top_id, set())
+            self.__top_id__ = top_id
+
+    def unsubscribe(self):
+        """
+        Use this method to stop applying the updates of the database chat subscribed with :meth:`AsyncTelegramDB.subscribe`.
+
+        Returns:
+            :obj:`None`
+        """
+        if self.__handlers__:
+            self.__backend__.remove_handlers(self.__handlers__)
+        self.__handlers__ = []
+
+    def __apply_update__(self, msg_id: int, text: Optional[str]):
+        """
+        This method is used to apply a new, edited or deleted message of the telegram database chat to the cache.
+
+        Parameters:
+            msg_id (:obj:`int`): Id of the message.
+            text (:obj:`str`): Text of the message, ``None`` if it was deleted.
+
+        Returns:
+            :obj:`None`
+        """
+        self.__top_id__ = max(self.__top_id__, msg_id)
+        parsed = _parse_datapacks([(msg_id, text)]) if text is not None else []
+        is_page = text is not None and any(msg_id in partition.pages for partition in self.__store__)
+        if text is None or is_page or parsed[0][2] is None:
+            # a deleted or invalid message drops its datapacks, an edited page drops the ones moved out of it
+            kept = {self.__resolve_name__(name, data) for _, _, name, data in parsed if name is not None}
+            for partition in self.__store__:
+                for key in partition.keys_at(msg_id):
+                    if (partition, key) not in kept and (partition.name, key) not in self.__pending__:
+                        partition.pop(key)
+                if text is None:
+                    partition.remove_page(msg_id)
+                else:
+                    partition.set_page_text(msg_id, text)
+            if self.__snapshot__:
+                self.__snapshot__.delete_ids([msg_id])
+        updates = []
+        for item in parsed:
+            if item[2] is not None:
+                partition, key = self.__resolve_name__(item[2], item[3])
+                if (partition.name, key) in self.__pending__:
+                    continue
+            updates.append(item)
+        rows = self.__apply_parsed__(updates)
+        if self.__snapshot__ and rows:
+            self.__snapshot__.save_many(rows)
+        if self.debug:
+            self.LOGGER.info(f"Applied an update of the message id '{msg_id}' of the database chat")
+
+    def prepare_datapack(self, datapack_class: DataPack, buckets: int=None):
         """
         Use this method to initialise the :class:`DataPack` with primary key member.
 
         Parameters:
             datapack_class (:class:`DataPack`): `DataPack` to be initialised with the primary key.
+            buckets (:obj:`int`, Optional): Number of buckets in which the datapacks are hashed by their primary key. Every bucket is stored in pages, messages with as many datapacks as they fit in ``MESSAGE_TEXT_LIMIT`` characters, instead of a message for every datapack.
         
         Returns:
             :obj:`None`
+
+        Example:
+            .. code-block:: python
+
+                # 100k users are stored in about 2k messages instead of 100k
+                SESSION.prepare_datapack(User, buckets=256)
         """
-        for i in inspect.getmembers(datapack_class):
-            if not i[0].startswith('_') and not inspect.ismethod(i[1]):
-                if isinstance(i[1], Member) and i[1].is_primary:
-                    if self.debug:
-                        self.LOGGER.info(f"Initialised {datapack_class} with primary key '{i[0]}'")
-                    self.__dp_cache__[datapack_class] = i[0]
-    
-    def commit(self, datapack: DataPack):
+        schema = datapack_class.__schema__
+        if self.debug and schema.primary_key is not None:
+            self.LOGGER.info(f"Initialised {datapack_class} with primary key '{schema.primary_key}'")
+        primary_key = schema.primary_key
+        indexes = {name: (SortedIndex if name in schema.ordered else HashIndex)(name, unique=unique) for name, unique in schema.indexes.items()}
+        self.__store__.partition(datapack_class.__datapack_name__).prepare(primary_key, indexes, datapack_class, buckets)
+
+    def count(self, datapack_class: type=None):
         """
-        Use this method to save the data on telegram database.
+        Use this method to count the datapacks stored in the database.
 
         Parameters:
-            datapack (:class:`DataPack`): Subclass of the `DataPack` of the data to be saved on telegram.
+            datapack_class (:obj:`type`, Optional): Subclass of the `DataPack` to be counted, all the datapacks are counted if not provided.
 
         Returns:
-            :obj:`None`
+            :obj:`int`
         """
-        if DP_NAME_SEPARATOR in datapack.__datapack_name__:
-            raise ReservedCharacter(datapack.__datapack_name__)
-        datapack = self.__fill_datapack(datapack)
-        self.__publish_data__(datapack, self.__format_datapack__(datapack))
-    
-    def __publish_data__(self, datapack: DataPack, data:str):
+        if datapack_class is None:
+            return len(self.__store__)
+        partition = self.__store__.partitions.get(datapack_class.__datapack_name__)
+        return len(partition) if partition else 0
+
+    def __check_name__(self, datapack: DataPack):
         """
-        This is method is used to publish the committed data on telegram database chat.
+        This method is used to check that the name of the type of a datapack can be committed, before anything is done with the datapack.
 
         Parameters:
-            datapack (:class:`DataPack`): Subclass of the `DataPack` of the data to be published on telegram database.
-            data (:obj:`str`): Formatted string of the data to be published on telegram database.
+            datapack (:class:`DataPack`): Subclass of the `DataPack`.
 
         Returns:
             :obj:`None`
         """
-        client = self.__telegram_client__
-        if client:
-            msg_id = 0
-            if datapack.__datapack_name__ in self.__datapacks__:
-                msg_id:int = self.__datapacks__[datapack.__datapack_name__]["id"]
-            if isinstance(client, Client):
-                if msg_id == 0:
-                    async def publish():
-                        nonlocal msg_id
-                        msg_id = (await client.send_message(chat_id=self.__chat_id__, text=data)).id
-                    self.__loop__.run_until_complete(publish())
-                    self.__commit_success__ = True
-                else:
-                    self.__get_data_from_cache(datapack)
-                    if self.__format_datapack__(datapack) == data:
-                        self.__commit_success__ = False
-                        if self.debug:
-                            self.LOGGER.warning(f"Exact values already stored: {datapack.__query_data__()}")
-                    else:
-                        try:
-                            self.__loop__.run_until_complete(client.edit_message_text(chat_id=self.__chat_id__, message_id=msg_id, text=data))
-                            self.__commit_success__ = True
-                        except:
-                            self.__commit_success__ = False
-                            if self.debug:
-                                self.LOGGER.warning(f"Failed to update: {datapack.__query_data__()}")
-                        
-            elif isinstance(client, TelegramClient):
-                if msg_id == 0:
-                    async def publish():
-                        nonlocal msg_id
-                        msg_id = (await client.send_message(entity=self.__chat_id__, message=data, parse_mode=None)).id
-                    self.__loop__.run_until_complete(publish())
-                    self.__commit_success__ = True
-                else:
-                    self.__get_data_from_cache(datapack)
-                    if self.__format_datapack__(datapack) == data:
-                        self.__commit_success__ = False
-                        if self.debug:
-                            self.LOGGER.warning(f"Exact values already stored: {datapack.__query_data__()}")
-                    else:
-                        try:
-                            self.__loop__.run_until_complete(client.edit_message(entity=self.__chat_id__, message=msg_id, text=data, parse_mode=None))
-                            self.__commit_success__ = True
-                        except:
-                            self.__commit_success__ = False
-                            if self.debug:
-                                self.LOGGER.warning(f"Failed to update: {datapack.__query_data__()}")
-            else:
-                raise InvalidClient()
-            if self.debug and self.__commit_success__:
-                self.LOGGER.info(datapack.__query_data__())
-            self.__datapacks__[datapack.__datapack_name__] = {"id": msg_id, "data":datapack.__get_dict__()}
-    
-    def get(self, datapack: DataPack):
+        for characters in (DP_NAME_SEPARATOR, DP_BUCKET_SEPARATOR):
+            if characters in datapack.__datapack_name__:
+                raise ReservedCharacter(datapack.__datapack_name__, characters)
+
+    def __key_of__(self, datapack: DataPack):
         """
-        Use this method to get the data from telegram database.
+        This method is used to get the partition of a datapack and the value of its primary key.
 
         Parameters:
-            datapack (:obj:`DataPack`): Object of the `DataPack` of the data to be retrieved from telegram database.
+            datapack (:class:`DataPack`): Subclass of the `DataPack`.
 
         Returns:
-            :obj:`bool`
+            :obj:`tuple`: :class:`Partition` of the type and the primary key, ``None`` if the type is not prepared.
         """
-        return self.__get_data_from_cache(self.__fill_datapack(datapack))
+        partition = self.__store__.partition(datapack.__datapack_name__)
+        if partition.primary_key is None:
+            return partition, None
+        return partition, datapack.__schema__.encode(partition.primary_key, getattr(datapack, partition.primary_key))
 
-    def __get_data_from_cache(self, datapack: DataPack):
+    def __record_name__(self, partition: Partition, key):
         """
-        This method fills data in the provided :obj:`DataPack` from the cache.
+        This method is used to get the name of a datapack written in its message, the type name and the primary key separated by `DP_NAME_SEPARATOR`.
 
         Parameters:
-            datapack (:obj:`DataPack`): Object of the `DataPack` of the data to be retrieved from telegram database.
+            partition (:class:`Partition`): Partition of the type.
+            key (:obj:`Any`): Primary key of the datapack.
 
         Returns:
-            :obj:`bool`
+            :obj:`str`
         """
-        if datapack.__datapack_name__ in self.__datapacks__:
-            data = self.__datapacks__[datapack.__datapack_name__]["data"]
-            for attribute in data:
-                setattr(datapack, attribute, data[attribute])
-            return True
-        return False
+        if key is None:
+            return partition.name
+        return f"{partition.name}{DP_NAME_SEPARATOR}{key}"
 
-    def get_all(self):
+    def __resolve_name__(self, name: str, data: dict):
         """
-        Use this method to get all data from telegram database.
+        This method is used to get the partition and the primary key of a datapack loaded from a message.
+
+        Parameters:
+            name (:obj:`str`): Name of the datapack written in the message.
+            data (:obj:`dict`): Data of the datapack.
 
         Returns:
-            A list containing elements of object :class:`DataPack`
+            :obj:`tuple`: :class:`Partition` of the type and the primary key.
         """
-        datapacks: List[DataPack] = []
-        for __datapack_name__ in self.__datapacks__:
-            data = self.__datapacks__[__datapack_name__]["data"]
-            obj = DataPack()
-            obj.__datapack_name__ = str(__datapack_name__).split(DP_NAME_SEPARATOR)[0]
-            for key in data:
-                setattr(obj, key, data[key])
-            datapacks.append(obj)
-        return datapacks
+        type_name, separator, key_text = name.partition(DP_NAME_SEPARATOR)
+        partition = self.__store__.partition(type_name)
+        return partition, partition.key_of(key_text if separator else None, data)
 
-    def delete(self, datapack: DataPack):
+    def __lock_keys__(self, keys: Iterable[tuple]):
         """
-        Use this method to delete data from telegram database.
+        This method is used to lock datapacks against the other writes of the same primary keys, the datapacks of a type with buckets are locked by bucket since they share pages.
+
+        Note:
+            Every lock id is hashed to one of ``KEY_LOCK_STRIPES`` locks, so writes of independent keys run in parallel unless their stripes collide.
 
         Parameters:
-            datapack (:obj:`DataPack`): Object of the `DataPack` of the data to be retrieved from telegram database.
+            keys (Iterable of :obj:`tuple`): ``(partition, primary key)`` tuples.
 
         Returns:
-            :obj:`bool`
+            An asynchronous context manager which holds the locks.
         """
-        datapack = self.__fill_datapack(datapack)
-        if not datapack.__datapack_name__ in self.__datapacks__:
-            return False
-        msg_id = int(self.__datapacks__[datapack.__datapack_name__]["id"])
-        del self.__datapacks__[datapack.__datapack_name__]
-        return self.__unpublish_data__(msg_id)
+        stripes = set()
+        for partition, key in keys:
+            lock_id = (partition.name, partition.bucket_of(key)) if partition.buckets else (partition.name, key)
+            stripes.add(hash(lock_id) % KEY_LOCK_STRIPES)
+        return _HeldLocks([self.__key_locks__[stripe] for stripe in sorted(stripes)])
 
-    def __unpublish_data__(self, msg_id: int):
+    def __check_unique__(self, partition: Partition, key, data: dict):
         """
-        This method is used to delete message storage of the data from telegram database.
+        This method is used to check that the unique members of a datapack aren't used by another datapack.
 
         Parameters:
-            msg_id (:obj:`int`): message id of the stored datapack to be deleted.
+            partition (:class:`Partition`): Partition of the type.
+            key (:obj:`Any`): Primary key of the datapack.
+            data (:obj:`dict`): Data of the datapack.
 
         Returns:
-            :obj:`bool`
+            :obj:`None`
         """
-        client = self.__telegram_client__
-        if client:
-            if isinstance(client, Client):
-                return self.__loop__.run_until_complete(client.delete_messages(chat_id=self.__chat_id__, message_ids=msg_id))
-            elif isinstance(client, TelegramClient):
-                try:
-                    self.__loop__.run_until_complete(client.delete_messages(entity=self.__chat_id__, message_ids=msg_id))
-                    return True
-                except:
-                    return False
+        for member, index in partition.indexes.items():
+            if index.unique and member in data and index.get(data[member]) - {key}:
+                raise UniqueViolation(member, data[member])
+
+    @_on_session_loop
+    @instrumented("find")
+    async def find(self, datapack_class: type, **members):
+        """
+        Use this method to find the datapacks by the values of their members, indexed members are looked up in their index.
+
+        Parameters:
+            datapack_class (:obj:`type`): Subclass of the `DataPack` to be found, prepared with :meth:`TelegramDB.prepare_datapack`.
+            **members: Values of the members to be matched.
+
+        Returns:
+            A list containing elements of object ``datapack_class``
+
+        Example:
+            .. code-block:: python
+
+                users = await SESSION.find(User, username="telegram")
+        """
+        datapacks = [datapack async for datapack in self.query(datapack_class).filter(**members)]
+        return await self.__load_datapacks_blobs__(datapacks)
+
+    def query(self, datapack_class: type):
+        """
+        Use this method to query the datapacks of a type, filtering and projecting them lazily. The query of an :class:`AsyncTelegramDB` is iterated with ``async for`` so the evicted datapacks can be fetched from telegram.
+
+        Parameters:
+            datapack_class (:obj:`type`): Subclass of the `DataPack` to be queried, prepared with :meth:`TelegramDB.prepare_datapack`.
+
+        Returns:
+            :class:`Query`
+
+        Example:
+            .. code-block:: python
+
+                for user in SESSION.query(User).filter(lambda user: user.id > 1000).only("id", "name"):
+                    print(user.name)
+        """
+        return Query(self, datapack_class)
+
+    @_on_session_loop
+    @instrumented("commit")
+    async def commit(self, datapack: DataPack):
+        """
+        Use this method to save the data on telegram database.
+
+        Parameters:
+            datapack (:class:`DataPack`): Subclass of the `DataPack` of the data to be saved on telegram.
+
+        Returns:
+            :obj:`None`
+        """
+        self.__check_name__(datapack)
+        partition, key = self.__key_of__(datapack)
+        async with self.__lock_keys__([(partition, key)]):
+            values = datapack.__get_dict__()
+            record = await self.__fetch_record__(partition, key)
+            if record and record.data == values:
+                if self.debug:
+                    self.LOGGER.warning(f"Exact values already stored: {datapack.__query_data__()}")
+                return
+            self.__check_unique__(partition, key, values)
+            values, data, unused_blobs = await self.__store_blobs__(partition, key, record, values)
+            if record and record.data == values:
+                # only the values stored as blobs were given, they didn't change
+                return
+            if self.write_behind:
+                await self.__enqueue_data__(partition, key, datapack, values, data)
+                self.__pending_deletes__.update(unused_blobs)
+                return
+            if partition.buckets:
+                await self.__publish_page_data__(partition, key, datapack, values)
             else:
-                raise InvalidClient()
-        return False            
+                await self.__publish_data__(partition, key, datapack, record, values, data)
+            if unused_blobs:
+                await self.__unpublish_data__(unused_blobs)
 
-    def __format_datapack__(self, datapack: DataPack):
+    @_on_session_loop
+    @instrumented("commit_many")
+    async def commit_many(self, datapacks: List[DataPack]):
         """
-        This method is used to format the :class:`DataPack` in a string which will be published on telegram database chat.
+        Use this method to save many datapacks on telegram database at once.
+
+        Note:
+            The datapacks are applied to the cache together and published with concurrent requests, the pages of a type with buckets are written once.
+            If a datapack can't be committed the cache is rolled back, the messages which were already published are restored on a best-effort basis and the error is raised.
 
         Parameters:
-            datapack (:class:`DataPack`): Subclass of the `DataPack` of the data to be published on telegram database.
+            datapacks (List of :class:`DataPack`): Subclasses of the `DataPack` of the data to be saved on telegram, the last one wins if two of them have the same primary key.
 
         Returns:
-            :obj:`str`
+            :obj:`None`
+
+        Example:
+            .. code-block:: python
+
+                await SESSION.commit_many([User(1, "a"), User(2, "b"), Group(-100, "c")])
         """
-        query = f"#{datapack.__datapack_name__}"
-        query += f"\n{datapack.__get_dict__()}"
-        return query
+        for datapack in datapacks:
+            self.__check_name__(datapack)
+        async with self.__lock_keys__([self.__key_of__(datapack) for datapack in datapacks]):
+            staged = {}
+            try:
+                for datapack in datapacks:
+                    partition, key = self.__key_of__(datapack)
+                    staged_key = (partition.name, key)
+                    old = staged[staged_key][3] if staged_key in staged else await self.__fetch_record__(partition, key)
+                    values = datapack.__get_dict__()
+                    self.__check_unique__(partition, key, values)
+                    values, _, _ = await self.__store_blobs__(partition, key, self.__get_record__(partition, key), values)
+                    staged[staged_key] = (partition, key, values, old)
+                    partition.set(key, old.id if old else 0, values)
+            except BaseException:
+                await self.__rollback__(list(staged.values()))
+                raise
+            staged = list(staged.values())
+            if self.write_behind:
+                for partition, key, values, old in staged:
+                    pending_key = (partition.name, key)
+                    if pending_key not in self.__pending__:
+                        await self.__reserve_queue__()
+                    self.__pending__[pending_key] = self.__format_datapack__(partition, key, values)
+                    self.__pending_deletes__.update(self.__unused_blobs__(old, values))
+                return
+            single = [entry for entry in staged if not entry[0].buckets]
+            bucketed = {}
+            for partition, key, values, old in staged:
+                if partition.buckets:
+                    bucketed.setdefault(partition.name, (partition, {}))[1][key] = values
+            results = await asyncio.gather(
+                *(self.__publish_staged__(partition, key, values, old) for partition, key, values, old in single),
+                *(self.__write_pages__(partition, datas) for partition, datas in bucketed.values()),
+                return_exceptions=True,
+            )
+            failures = [result for result in results if isinstance(result, BaseException)]
+            if failures:
+                restores = []
+                for (partition, key, values, old), msg_id in zip(single, results):
+                    if isinstance(msg_id, BaseException):
+                        continue
+                    if not old or not old.id:
+                        restores.append(self.__delete_messages__([msg_id]))
+                    elif old.data != values:
+                        restores.append(self.__edit_message__(old.id, self.__format_datapack__(partition, key, old.data)))
+                await self.__rollback__(staged)
+                for (partition, datas), msg_ids in zip(bucketed.values(), results[len(single):]):
+                    if not isinstance(msg_ids, BaseException):
+                        olds = {key: old.data for _, key, _, old in staged if key in datas and old}
+                        restores.append(self.__write_pages__(partition, olds, set(msg_ids.values())))
+                await asyncio.gather(*restores, return_exceptions=True)
+                raise failures[0]
+            msg_ids = dict(zip(((partition.name, key) for partition, key, _, _ in single), results))
+            for (partition, _), result in zip(bucketed.values(), results[len(single):]):
+                msg_ids.update(((partition.name, key), msg_id) for key, msg_id in result.items())
+            unused_blobs = []
+            for partition, key, values, old in staged:
+                msg_id = msg_ids[(partition.name, key)]
+                if not partition.buckets and self.__snapshot__ and (not old or old.data != values):
+                    self.__snapshot__.save(self.__record_name__(partition, key), msg_id, self.__format_datapack__(partition, key, values))
+                partition.set_id(key, msg_id)
+                unused_blobs += self.__unused_blobs__(old, values)
+            if self.debug:
+                self.LOGGER.info(f"Committed {len(staged)} datapacks")
+            await self.__unpublish_data__(unused_blobs)
 
-    def __get_datapacks__(self):
+    def transaction(self):
         """
-        This method is used to load the existing data from the telegram database chat.
+        Use this method to stage many commits and save them at once with :meth:`TelegramDB.commit_many` when the block exits, nothing is saved if it raises an error.
+
+        Returns:
+            :class:`Transaction`
+
+        Example:
+            .. code-block:: python
+
+                async with SESSION.transaction() as transaction:
+                    for user in users:
+                        transaction.commit(user)
+        """
+        return Transaction(self)
+
+    async def __publish_staged__(self, partition: Partition, key, values: dict, old):
+        """
+        This method is used to publish a datapack committed by :meth:`TelegramDB.commit_many` in its own message.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapack.
+            key (:obj:`Any`): Primary key of the datapack.
+            values (:obj:`dict`): Data of the datapack.
+            old (:class:`Record`): Record of the datapack before the commit, ``None`` if it is new.
+
+        Returns:
+            :obj:`int`: Message id of the datapack.
+        """
+        if not old or not old.id:
+            return await self.__send_message__(self.__format_datapack__(partition, key, values))
+        if old.data != values:
+            return await self.__edit_or_send__(old.id, self.__format_datapack__(partition, key, values))
+        return old.id
+
+    async def __rollback__(self, staged: List[tuple]):
+        """
+        This method is used to restore the cache after a failed :meth:`TelegramDB.commit_many`, the blobs uploaded by it are deleted.
+
+        Parameters:
+            staged (List of :obj:`tuple`): ``(partition, primary key, data, old record)`` tuples of the staged datapacks.
 
         Returns:
             :obj:`None`
         """
-        if isinstance(self.__telegram_client__, Client):
-            from pyrogram.types import Message
-            for message in self.__telegram_client__.get_chat_history(self.__chat_id__):
-                message: Message = message
-                if not message.text:
-                    continue
-                try:
-                    text = message.text.markdown.split("\n", 1)
-                    self.__datapacks__[text[0][1:]] = {"id":message.message_id, "data":literal_eval(text[1])}
-                except:
-                    raise InvalidDataPack(message.message_id)
-                
-        elif isinstance(self.__telegram_client__, TelegramClient):
-            from telethon.tl.types import Message
-            for message in self.__telegram_client__.iter_messages(self.__chat_id__):
-                message: Message = message
-                if not message.message:
-                    continue
-                try:
-                    text = message.message.split("\n", 1)
-                    self.__datapacks__[text[0][1:]] = {"id":message.id, "data":literal_eval(text[1])}
-                except:
-                    raise InvalidDataPack(message.id)
-            # raise UnsupportedClient("telethon")
-        else:
-            raise InvalidClient()
-    
-    def __make_chat__(self):
+        uploaded = []
+        for partition, key, values, old in staged:
+            if old is None:
+                partition.pop(key)
+            else:
+                partition.set(key, old.id, old.data)
+            uploaded += self.__unused_blobs__(Record(0, values), old.data if old else {})
+        await self.__unpublish_data__(uploaded)
+
+    def __unused_blobs__(self, old, values: dict):
         """
-        This method is used to make the telegram database chat if not provided.
+        This method is used to get the blobs of a record which aren't used by the new data of its datapack.
+
+        Parameters:
+            old (:class:`Record`): Old record of the datapack, ``None`` if there is none.
+            values (:obj:`dict`): New data of the datapack.
+
+        Returns:
+            List of :obj:`int`: Message ids of the unused blobs.
+        """
+        used = {value for value in values.values() if isinstance(value, Blob)}
+        return [value.msg_id for value in (old.data.values() if old else ()) if isinstance(value, Blob) and value not in used]
+
+    async def __store_blobs__(self, partition: Partition, key, record: Record, values: dict):
+        """
+        This method is used to store the largest values of a datapack as blobs while its message exceeds ``MESSAGE_TEXT_LIMIT`` characters.
+
+        Note:
+            The blobs of the stored datapack are kept for the values which didn't change.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapack.
+            key (:obj:`Any`): Primary key of the datapack.
+            record (:class:`Record`): Stored record of the datapack, ``None`` if it is new.
+            values (:obj:`dict`): Data of the datapack.
+
+        Returns:
+            :obj:`tuple`: Data of the datapack with a :class:`Blob` in place of the stored values, its formatted string and a list with the message ids of the blobs which are no longer used.
+        """
+        old_blobs = {member: value for member, value in record.data.items() if isinstance(value, Blob)} if record else {}
+        data = self.__format_datapack__(partition, key, values)
+        if len(data) > MESSAGE_TEXT_LIMIT:
+            values = dict(values)
+            sizes = sorted(
+                ((len(encode_data({member: value}, self.__codec__)), member) for member, value in values.items()
+                 if member != partition.primary_key and not isinstance(value, Blob)),
+                reverse=True,
+            )
+            for _, member in sizes:
+                payload, digest = compress_value(values[member], self.__codec__)
+                blob = old_blobs.get(member)
+                if blob is None or blob.digest != digest:
+                    blob = Blob(await self.__upload_blob__(payload), digest)
+                values[member] = blob
+                data = self.__format_datapack__(partition, key, values)
+                if len(data) <= MESSAGE_TEXT_LIMIT:
+                    break
+        used = {value for value in values.values() if isinstance(value, Blob)}
+        return values, data, [blob.msg_id for blob in old_blobs.values() if blob not in used]
+
+    async def __load_blobs__(self, values: dict):
+        """
+        This method is used to download the values of a datapack stored as blobs.
+
+        Parameters:
+            values (:obj:`dict`): Data of the datapack.
+
+        Returns:
+            :obj:`dict`: Data of the datapack with the downloaded values.
+        """
+        blobs = {member: value for member, value in values.items() if isinstance(value, Blob)}
+        if not blobs:
+            return values
+        downloaded = await asyncio.gather(*(self.__download_blob__(blob) for blob in blobs.values()))
+        return {**values, **dict(zip(blobs, downloaded))}
+
+    async def __load_datapacks_blobs__(self, datapacks: List[DataPack]):
+        """
+        This method is used to download the values stored as blobs of many datapacks.
+
+        Parameters:
+            datapacks (List of :class:`DataPack`): Datapacks built from the cache.
+
+        Returns:
+            The same list of datapacks.
+        """
+        for datapack in datapacks:
+            values = datapack.__get_dict__()
+            if any(isinstance(value, Blob) for value in values.values()):
+                datapack.__set_dict__(await self.__load_blobs__(values))
+        return datapacks
+
+    async def __publish_data__(self, partition: Partition, key, datapack: DataPack, record: Record, values: dict, data:str):
+        """
+        This is method is used to publish the committed data on telegram database chat.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapack.
+            key (:obj:`Any`): Primary key of the datapack.
+            datapack (:class:`DataPack`): Subclass of the `DataPack` of the data to be published on telegram database.
+            record (:class:`Record`): Stored record of the datapack, ``None`` if it is new.
+            values (:obj:`dict`): Data of the datapack to be cached, with its blobs.
+            data (:obj:`str`): Formatted string of the data to be published on telegram database.
 
         Returns:
             :obj:`None`
         """
-        if isinstance(self.__telegram_client__, Client):
-            chat = self.__telegram_client__.create_channel("Telegram DB")
-            self.__chat_id__ = chat.id
-        elif isinstance(self.__telegram_client__, TelegramClient):
-            from telethon import functions
-            with self.__telegram_client__ as client:
-                async def make_chat():    
-                    result = await client(functions.channels.CreateChannelRequest(
-                        title='Telegram DB',
-                        about="Channel to store DataPacks",
-                        broadcast=True,
-                    ))
-                    self.__chat_id__ = result.__dict__["chats"][0].__dict__["id"]
-                self.__loop__.run_until_complete(make_chat())
+        if record and record.id:
+            msg_id = await self.__edit_or_send__(record.id, data)
         else:
-            raise InvalidClient()
-    
-    def __fill_datapack(self, datapack: DataPack):
+            msg_id = await self.__send_message__(data)
+        if self.debug:
+            self.LOGGER.info(datapack.__query_data__())
+        if self.__snapshot__:
+            self.__snapshot__.save(self.__record_name__(partition, key), msg_id, data)
+        partition.set(key, msg_id, values)
+
+    async def __publish_page_data__(self, partition: Partition, key, datapack: DataPack, data: dict):
         """
-        This method is used to append the primary key in default name of the datapack, separated by `DP_NAME_SEPARATOR`. 
+        This is method is used to publish the committed data of a type with buckets in the page of its bucket.
 
         Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapack.
+            key (:obj:`Any`): Primary key of the datapack.
             datapack (:class:`DataPack`): Subclass of the `DataPack` of the data to be published on telegram database.
+            data (:obj:`dict`): Data of the datapack to be published, with its blobs.
 
         Returns:
-            :class:`DataPack`
+            :obj:`None`
+        """
+        msg_ids = await self.__write_pages__(partition, {key: data})
+        if self.debug:
+            self.LOGGER.info(datapack.__query_data__())
+        partition.set(key, msg_ids[key], data)
+
+    async def __write_pages__(self, partition: Partition, datas: dict, pages: Iterable[int]=()):
         """
-        for dp in self.__dp_cache__:
-            if isinstance(datapack, dp):
-                datapack.__datapack_name__ += f"{DP_NAME_SEPARATOR}" + str(getattr(datapack, self.__dp_cache__[dp]))
-                break
-        return datapack
\ No newline at end of file
+        This method is used to write datapacks in the pages of their buckets, every page is edited at most once.
+
+        Note:
+            A datapack stays in its page while the page fits in ``MESSAGE_TEXT_LIMIT`` characters, otherwise it is moved to another page of its bucket or to a new one.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapacks.
+            datas (:obj:`dict`): Data of the datapacks to be written, mapped by their primary key.
+            pages (Iterable of :obj:`int`, Optional): Message ids of other pages to be written again, e.g. after a delete. Empty pages are deleted.
+
+        Returns:
+            :obj:`dict`: Message id of the page of every written datapack, mapped by its primary key.
+        """
+        contents, dirty, new_pages, moved, stale = {}, set(pages), {}, [], []
+
+        async def fits(page: int, bucket: int, key):
+            if page not in contents:
+                contents[page] = await self.__page_data__(partition, page)
+            contents[page][key] = datas[key]
+            if len(self.__format_page__(partition, bucket, contents[page])) <= MESSAGE_TEXT_LIMIT:
+                dirty.add(page)
+                return True
+            del contents[page][key]
+            return False
+
+        for page in dirty:
+            contents[page] = await self.__page_data__(partition, page)
+        for key in datas:
+            msg_id = partition.get_id(key)
+            if msg_id in partition.pages:
+                if await fits(msg_id, partition.pages[msg_id], key):
+                    continue
+                # it doesn't fit anymore, the page is written without it
+                dirty.add(msg_id)
+            elif msg_id:
+                stale.append(msg_id)
+            moved.append(key)
+        for key in moved:
+            bucket = partition.bucket_of(key)
+            candidates = partition.bucket_pages(bucket) + [page for page, page_bucket in new_pages.items() if page_bucket == bucket]
+            for page in candidates:
+                if await fits(page, bucket, key):
+                    break
+            else:
+                # new pages get a negative id until they are sent
+                page = -len(new_pages) - 1
+                new_pages[page] = bucket
+                contents[page] = {key: datas[key]}
+                dirty.add(page)
+
+        msg_ids = {}
+        for page in sorted(dirty):
+            content = contents[page]
+            bucket = partition.pages.get(page, new_pages.get(page))
+            if not content:
+                await self.__delete_messages__([page])
+                partition.remove_page(page)
+                if self.__snapshot__:
+                    self.__snapshot__.delete_ids([page])
+                continue
+            text = self.__format_page__(partition, bucket, content)
+            if partition.is_page_text(page, text):
+                # written again with the same datapacks, e.g. by a repeated import
+                msg_ids.update((key, page) for key in content if key in datas)
+                continue
+            if page < 0:
+                page = await self.__send_message__(text)
+                partition.add_page(page, bucket)
+            else:
+                sent = await self.__edit_or_send__(page, text)
+                if sent != page:
+                    # the page was deleted by someone else, its datapacks move to the new one
+                    partition.remove_page(page)
+                    partition.add_page(sent, bucket)
+                    for key in content:
+                        if key in partition:
+                            partition.set_id(key, sent)
+                    if self.__snapshot__:
+                        self.__snapshot__.delete_ids([page])
+                    page = sent
+            partition.set_page_text(page, text)
+            if self.__snapshot__:
+                self.__snapshot__.save(f"{_parse_page(text)[0]}{DP_NAME_SEPARATOR}{page}", page, text)
+            msg_ids.update((key, page) for key in content if key in datas)
+        if stale:
+            # datapacks which had their own message before the type had buckets
+            await self.__delete_messages__(stale)
+            if self.__snapshot__:
+                self.__snapshot__.delete_ids(stale)
+        return msg_ids
+
+    async def __page_data__(self, partition: Partition, page: int):
+        """
+        This method is used to get the data of the datapacks stored in a page, the page is fetched from the telegram database chat if some of them are evicted.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the page.
+            page (:obj:`int`): Message id of the page.
+
+        Returns:
+            :obj:`dict`: Data of the datapacks mapped by their primary key.
+        """
+        data, missing = {}, set()
+        for key in list(partition.page_keys.get(page, ())):
+            record = self.__get_record__(partition, key)
+            if record is None:
+                missing.add(key)
+            else:
+                data[key] = record.data
+        if missing:
+            (_, text), = await self.__get_messages__([page])
+            for _, _, name, value in _parse_datapacks([(page, text)] if text else []):
+                if name is not None:
+                    entry_partition, key = self.__resolve_name__(name, value)
+                    if entry_partition is partition and key in missing:
+                        data[key] = value
+        return data
+
+    def __format_page__(self, partition: Partition, bucket: int, data: dict):
+        """
+        This method is used to format the datapacks of a page in a string which will be published on telegram database chat, the datapacks are sorted by the text of their primary key so the same datapacks always give the same text.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the page.
+            bucket (:obj:`int`): Bucket of the page.
+            data (:obj:`dict`): Data of the datapacks mapped by their primary key.
+
+        Returns:
+            :obj:`str`
+        """
+        query = f"#{partition.name}{DP_BUCKET_SEPARATOR}{bucket}"
+        entries = sorted(((str(key), dump_blobs(value)) for key, value in data.items()), key=lambda entry: entry[0])
+        query += f"\n{encode_data(dict(entries), self.__codec__)}"
+        return query
+
+    @_on_session_loop
+    @instrumented("get")
+    async def get(self, datapack: DataPack):
+        """
+        Use this method to get the data from telegram database.
+
+        Parameters:
+            datapack (:obj:`DataPack`): Object of the `DataPack` of the data to be retrieved from telegram database.
+
+        Returns:
+            :obj:`bool`
+        """
+        return await self.__get_datapack__(datapack)
+
+    async def __get_datapack__(self, datapack: DataPack):
+        """
+        This method is used to fill a datapack with its stored data.
+
+        Parameters:
+            datapack (:obj:`DataPack`): Object of the `DataPack` of the data to be retrieved from telegram database.
+
+        Returns:
+            :obj:`bool`
+        """
+        partition, key = self.__key_of__(datapack)
+        record = await self.__fetch_record__(partition, key)
+        if record is None:
+            return False
+        datapack.__set_dict__(await self.__load_blobs__(record.data))
+        return True
+
+    def __get_record__(self, partition: Partition, key):
+        """
+        This method is used to get the record of a datapack from the cache, an evicted datapack is cached again if its message is pending or stored in the snapshot.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapack.
+            key (:obj:`Any`): Primary key of the datapack.
+
+        Returns:
+            :class:`Record`: ``None`` if the datapack is not stored or it can't be read without telegram.
+        """
+        record = partition.get(key)
+        if record is not None or key not in partition.evicted:
+            if self.metrics is not None and record is not None:
+                self.metrics.inc("telegramdb_cache_hits_total")
+            return record
+        if self.metrics is not None:
+            self.metrics.inc("telegramdb_cache_misses_total")
+        msg_id = partition.get_id(key)
+        text = self.__pending__.get((partition.name, key))
+        if text is None and self.__snapshot__:
+            text = self.__snapshot__.get_text(msg_id)
+        if text is None:
+            return None
+        return self.__cache_record__(partition, key, msg_id, text)
+
+    async def __fetch_record__(self, partition: Partition, key):
+        """
+        This method is used to get the record of a datapack, an evicted datapack is fetched from the telegram database chat by its message id.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapack.
+            key (:obj:`Any`): Primary key of the datapack.
+
+        Returns:
+            :class:`Record`: ``None`` if the datapack is not stored.
+        """
+        record = self.__get_record__(partition, key)
+        if record is not None or key not in partition.evicted:
+            return record
+        msg_id = partition.get_id(key)
+        (_, text), = await self.__get_messages__([msg_id])
+        return self.__cache_record__(partition, key, msg_id, text)
+
+    def __cache_record__(self, partition: Partition, key, msg_id: int, text: str):
+        """
+        This method is used to cache again the record of an evicted datapack from the text of its message, it is removed if the message was deleted or changed.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapack.
+            key (:obj:`Any`): Primary key of the datapack.
+            msg_id (:obj:`int`): Message id of the datapack.
+            text (:obj:`str`): Text of the message, ``None`` if it was deleted.
+
+        Returns:
+            :class:`Record`: ``None`` if the datapack is no longer stored.
+        """
+        for _, _, name, data in _parse_datapacks([(msg_id, text)] if text else []):
+            if name is not None and self.__resolve_name__(name, data) == (partition, key):
+                partition.set(key, msg_id, data)
+                return partition.get(key)
+        partition.pop(key)
+        return None
+
+    @_on_session_loop
+    @instrumented("get_all")
+    async def get_all(self):
+        """
+        Use this method to get all data from telegram database.
+
+        Returns:
+            A list containing elements of object :class:`DataPack`
+        """
+        fetched = {}
+        for partition in self.__store__:
+            if not partition.evicted:
+                continue
+            records = await self.__fetch_records__(partition, partition.keys())
+            fetched.update(((partition.name, key), record) for key, record in records.items())
+        return await self.__load_datapacks_blobs__(self.__get_all_from_cache__(fetched))
+
+    @_on_session_loop
+    @instrumented("export")
+    async def export(self, fp: TextIO):
+        """
+        Use this method to write every datapack in a file as JSON Lines, e.g. to migrate or back up the database.
+
+        Note:
+            The datapacks are streamed type by type in chunks of ``GET_MESSAGES_LIMIT``, the evicted ones are fetched without keeping more than ``cache_size`` of them in memory.
+            The values stored as blobs are downloaded and written in place of their references.
+
+        Parameters:
+            fp (:obj:`TextIO`): File opened in text mode in which the datapacks are written.
+
+        Returns:
+            :obj:`int`: Number of exported datapacks.
+
+        Example:
+            .. code-block:: python
+
+                with open("backup.jsonl", "w") as fp:
+                    await SESSION.export(fp)
+        """
+        exported = 0
+        for partition in self.__store__:
+            keys = partition.keys()
+            for i in range(0, len(keys), GET_MESSAGES_LIMIT):
+                records = await self.__fetch_records__(partition, keys[i:i + GET_MESSAGES_LIMIT])
+                for record in records.values():
+                    fp.write(_dump_line(partition.name, dump_blobs(await self.__load_blobs__(record.data))))
+                    exported += 1
+        if self.debug:
+            self.LOGGER.info(f"Exported {exported} datapacks")
+        return exported
+
+    @_on_session_loop
+    @instrumented("import")
+    async def import_(self, fp: TextIO, batch_size: int=100, checkpoint: str=None):
+        """
+        Use this method to commit the datapacks written by :meth:`AsyncTelegramDB.export`, in batches of concurrent requests paced by the scheduler.
+
+        Note:
+            Every type of the export must be prepared before the import, :class:`UnpreparedDataPack` is raised at the first datapack of another type since it has no primary key to be stored by. The batches committed before it are kept in the checkpoint.
+            Every batch is committed with :meth:`AsyncTelegramDB.commit_many`, the types with buckets are written a page at a time.
+            A datapack which is already stored with the same data isn't written again, so an interrupted import can be repeated.
+
+        Parameters:
+            fp (:obj:`TextIO`): File opened in text mode from which the datapacks are read.
+            batch_size (:obj:`int`, Optional): Number of datapacks committed at once.
+            checkpoint (:obj:`str`, Optional): Path of a file in which the number of imported lines is saved after every batch, the import resumes from it and it is removed when the import is complete.
+
+        Returns:
+            :obj:`int`: Number of imported datapacks.
+
+        Example:
+            .. code-block:: python
+
+                with open("backup.jsonl") as fp:
+                    await SESSION.import_(fp, checkpoint="backup.checkpoint")
+        """
+        done = 0
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as file:
+                done = int(file.read() or 0)
+        imported, batch = 0, []
+        for line_number, line in enumerate(fp, 1):
+            if line_number <= done or not line.strip():
+                continue
+            name, data = _load_line(line)
+            partition = self.__store__.partitions.get(name)
+            if partition is None or partition.primary_key is None:
+                raise UnpreparedDataPack(name)
+            datapack = partition.datapack_class.__new__(partition.datapack_class)
+            datapack.__set_dict__(data)
+            batch.append(datapack)
+            if len(batch) >= batch_size:
+                await AsyncTelegramDB.commit_many(self, batch)
+                imported += len(batch)
+                batch = []
+                if checkpoint:
+                    self.__save_checkpoint__(checkpoint, line_number)
+        if batch:
+            await AsyncTelegramDB.commit_many(self, batch)
+            imported += len(batch)
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        if self.debug:
+            self.LOGGER.info(f"Imported {imported} datapacks")
+        return imported
+
+    def __save_checkpoint__(self, path: str, line_number: int):
+        """
+        This method is used to save the number of imported lines, the file is replaced at once so it's never left half written.
+
+        Parameters:
+            path (:obj:`str`): Path of the checkpoint.
+            line_number (:obj:`int`): Number of imported lines.
+
+        Returns:
+            :obj:`None`
+        """
+        with open(f"{path}.tmp", "w") as file:
+            file.write(str(line_number))
+        os.replace(f"{path}.tmp", path)
+
+    async def __fetch_records__(self, partition: Partition, keys: list):
+        """
+        This method is used to get the records of many datapacks, the evicted ones which can't be read from the snapshot are fetched from the telegram database chat in chunks of ``GET_MESSAGES_LIMIT`` messages.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapacks.
+            keys (:obj:`list`): Primary keys of the datapacks.
+
+        Returns:
+            :obj:`dict`: Records of the stored datapacks mapped by their primary key.
+        """
+        records, missing = {}, []
+        for key in keys:
+            record = self.__get_record__(partition, key)
+            if record is not None:
+                records[key] = record
+            elif key in partition.evicted:
+                missing.append(key)
+        for i in range(0, len(missing), GET_MESSAGES_LIMIT):
+            chunk = missing[i:i + GET_MESSAGES_LIMIT]
+            messages = await self.__get_messages__([partition.get_id(key) for key in chunk])
+            for key, (msg_id, text) in zip(chunk, messages):
+                record = self.__cache_record__(partition, key, msg_id, text)
+                if record is not None:
+                    records[key] = record
+        return records
+
+    def __read_evicted__(self, partition: Partition, keys: list):
+        """
+        This method is used to read the evicted datapacks of a query iterated with ``for``, it raises :class:`EvictedDataPack` since they can't be fetched from telegram without awaiting.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapacks.
+            keys (:obj:`list`): Primary keys of the evicted datapacks.
+
+        Returns:
+            :obj:`dict`: Records of the stored datapacks mapped by their primary key.
+        """
+        raise EvictedDataPack(partition.name, len(keys))
+
+    @_on_session_loop
+    async def __fetch_evicted__(self, partition: Partition, keys: list):
+        """
+        This method is used to fetch the evicted datapacks of a query iterated with ``async for``.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapacks.
+            keys (:obj:`list`): Primary keys of the evicted datapacks.
+
+        Returns:
+            :obj:`dict`: Records of the stored datapacks mapped by their primary key.
+        """
+        return await self.__fetch_records__(partition, keys)
+
+    def __get_all_from_cache__(self, fetched: dict=None):
+        """
+        This method builds a :class:`DataPack` for every entry of the cache.
+
+        Parameters:
+            fetched (:obj:`dict`, Optional): Records of the types with evicted datapacks which were fetched, mapped by the name of their type and their primary key.
+
+        Returns:
+            A list containing elements of object :class:`DataPack`
+        """
+        datapacks: List[DataPack] = []
+        for partition in self.__store__:
+            datapack_class = partition.datapack_class or _DynamicDataPack
+            for key in partition.keys():
+                record = fetched.get((partition.name, key)) if fetched else None
+                record = record or self.__get_record__(partition, key)
+                if record is None:
+                    continue
+                obj = datapack_class.__new__(datapack_class)
+                if datapack_class is _DynamicDataPack:
+                    obj.__datapack_name__ = partition.name
+                obj.__set_dict__(record.data)
+                datapacks.append(obj)
+        return datapacks
+
+    @_on_session_loop
+    @instrumented("delete")
+    async def delete(self, datapack: DataPack):
+        """
+        Use this method to delete data from telegram database.
+
+        Parameters:
+            datapack (:obj:`DataPack`): Object of the `DataPack` of the data to be retrieved from telegram database.
+
+        Returns:
+            :obj:`bool`
+        """
+        partition, key = self.__key_of__(datapack)
+        async with self.__lock_keys__([(partition, key)]):
+            if await self.__fetch_record__(partition, key) is None:
+                return False
+            record = partition.pop(key)
+            msg_id = int(record.id)
+            blobs = [value.msg_id for value in record.data.values() if isinstance(value, Blob)]
+            if self.write_behind:
+                self.__pending__.pop((partition.name, key), None)
+                if msg_id or blobs:
+                    await self.__reserve_queue__()
+                    self.__pending_deletes__.update(blobs)
+                if msg_id in partition.pages:
+                    self.__pending_pages__.add((partition.name, msg_id))
+                elif msg_id:
+                    self.__pending_deletes__.add(msg_id)
+                return True
+            if msg_id in partition.pages:
+                try:
+                    await self.__write_pages__(partition, {}, [msg_id])
+                except Exception:
+                    return False
+                return await self.__unpublish_data__(blobs)
+            if self.__snapshot__:
+                self.__snapshot__.delete_ids([msg_id])
+            return await self.__unpublish_data__([msg_id] + blobs)
+
+    @_on_session_loop
+    @instrumented("compact")
+    async def compact(self, chat_id: Union[int, str]=None, new_chat: bool=False):
+        """
+        Use this method to remove the messages of the database chat which don't store any datapack, e.g. duplicates left by concurrent commits, invalid messages and pages left empty, and to pack the datapacks of the types with buckets in as few pages as they fit.
+
+        Note:
+            The pending writes are flushed and the messages sent by other sessions since the start are loaded first, the session shouldn't be written while it is compacted.
+            Only the messages of datapacks which were written again later, invalid messages and empty pages are deleted, a datapack of an unknown type is kept.
+            The datapacks are rewritten in another chat if ``chat_id`` or ``new_chat`` are given, including their blobs, and the session switches to it only after all of them were written.
+            The old chat is left as it is, the other sessions keep using it until they are started on the new one.
+
+        Parameters:
+            chat_id (:obj:`int` | :obj:`str`, Optional): Chat in which the datapacks are rewritten, it should be empty.
+            new_chat (:obj:`bool`, Optional): The datapacks are rewritten in a new channel if it is set to ``True``.
+
+        Returns:
+            :obj:`dict`: Number of ``duplicates``, ``invalid`` and ``empty`` messages found, ``deleted`` messages, ``pages`` before and after and the ``chat_id`` of the database chat.
+
+        Example:
+            .. code-block:: python
+
+                report = await SESSION.compact()
+                print(f"{report['deleted']} messages deleted")
+        """
+        await AsyncTelegramDB.flush(self)
+        await self.__catch_up__()
+        report = {"duplicates": 0, "invalid": 0, "empty": 0, "deleted": 0, "pages": [0, 0]}
+        report["pages"][0] = sum(len(partition.pages) for partition in self.__store__)
+        if chat_id is None and new_chat:
+            chat_id = await self.__scheduler__.call(None, self.__backend__.create_chat, "Telegram DB")
+        if chat_id is not None and chat_id != self.__chat_id__:
+            await self.__rewrite__(chat_id)
+        else:
+            await self.__collect_garbage__(report)
+            for partition in self.__store__:
+                if partition.buckets:
+                    # a type at a time, only its datapacks are fetched at once
+                    records = await self.__fetch_records__(partition, partition.keys())
+                    report["deleted"] += await self.__repack_pages__(partition, records)
+        report["pages"][1] = sum(len(partition.pages) for partition in self.__store__)
+        report["pages"] = tuple(report["pages"])
+        report["chat_id"] = self.__chat_id__
+        if self.debug:
+            self.LOGGER.info(f"Compacted the database chat: {report}")
+        return report
+
+    async def __collect_garbage__(self, report: dict):
+        """
+        This method is used to delete the text messages of the telegram database chat which don't store a datapack, up to the last message loaded by the session.
+
+        Note:
+            A message is deleted only if it's invalid, an empty page or if all its datapacks are stored in other messages, a datapack which isn't in the cache is kept.
+            Messages without text, e.g. the documents of the blobs, are never deleted.
+
+        Parameters:
+            report (:obj:`dict`): Report of :meth:`AsyncTelegramDB.compact` to be updated.
+
+        Returns:
+            :obj:`None`
+        """
+        live = set()
+        for partition in self.__store__:
+            live.update(partition.pages)
+            live.update(partition.get_id(key) for key in partition.keys())
+        top_id = self.__top_id__
+        semaphore = asyncio.Semaphore(self.load_concurrency)
+
+        async def get_chunk(start: int):
+            async with semaphore:
+                return await self.__get_messages__(list(range(start, min(start + GET_MESSAGES_LIMIT, top_id + 1))))
+
+        def is_stored(name: str, data: dict):
+            partition, key = self.__resolve_name__(name, data)
+            return key in partition
+
+        garbage = []
+        for messages in await asyncio.gather(*(get_chunk(start) for start in range(1, top_id + 1, GET_MESSAGES_LIMIT))):
+            for msg_id, text in messages:
+                # non-text messages can't be told apart from deleted ones, orphaned blobs are left
+                if text is None or msg_id in live:
+                    continue
+                parsed = _parse_datapacks([(msg_id, text)])
+                if not parsed:
+                    kind = "empty"
+                elif any(name is None for _, _, name, _ in parsed):
+                    kind = "invalid"
+                elif all(is_stored(name, data) for _, _, name, data in parsed):
+                    kind = "duplicates"
+                else:
+                    continue
+                garbage.append(msg_id)
+                report[kind] += 1
+        if garbage:
+            await self.__delete_messages__(garbage)
+            if self.__snapshot__:
+                self.__snapshot__.delete_ids(garbage)
+        deleted = set(garbage)
+        self.invalid_messages = [msg_id for msg_id in self.invalid_messages if msg_id not in deleted]
+        report["deleted"] += len(garbage)
+
+    def __pack__(self, partition: Partition, datas: dict):
+        """
+        This method is used to pack datapacks of the same type in as few pages as they fit, bucket by bucket.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapacks.
+            datas (:obj:`dict`): Data of the datapacks mapped by their primary key.
+
+        Returns:
+            :obj:`dict`: List with the content of every page of a bucket, mapped by the bucket.
+        """
+        buckets = {}
+        for key, data in datas.items():
+            pages = buckets.setdefault(partition.bucket_of(key), [{}])
+            pages[-1][key] = data
+            if len(pages[-1]) > 1 and len(self.__format_page__(partition, partition.bucket_of(key), pages[-1])) > MESSAGE_TEXT_LIMIT:
+                del pages[-1][key]
+                pages.append({key: data})
+        return buckets
+
+    async def __repack_pages__(self, partition: Partition, records: dict):
+        """
+        This method is used to rewrite the buckets of a type which are stored in more pages than they need, the pages are edited before the emptied ones are deleted.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type, it has buckets.
+            records (:obj:`dict`): Records of the type mapped by their primary key.
+
+        Returns:
+            :obj:`int`: Number of deleted pages.
+        """
+        deleted = 0
+        for bucket, contents in self.__pack__(partition, {key: record.data for key, record in records.items()}).items():
+            pages = sorted(partition.bucket_pages(bucket))
+            if len(contents) >= len(pages):
+                continue
+            for page, content in zip(pages, contents):
+                text = self.__format_page__(partition, bucket, content)
+                await self.__edit_message__(page, text)
+                partition.set_page_text(page, text)
+                for key in content:
+                    partition.set_id(key, page)
+                if self.__snapshot__:
+                    self.__snapshot__.save(f"{_parse_page(text)[0]}{DP_NAME_SEPARATOR}{page}", page, text)
+            emptied = pages[len(contents):]
+            await self.__delete_messages__(emptied)
+            for page in emptied:
+                partition.remove_page(page)
+            if self.__snapshot__:
+                self.__snapshot__.delete_ids(emptied)
+            deleted += len(emptied)
+        return deleted
+
+    async def __rewrite__(self, chat_id: Union[int, str]):
+        """
+        This method is used to write every datapack in another chat and switch the session to it.
+
+        Note:
+            The evicted datapacks are fetched a chunk at a time, a type with buckets is packed at once, and the new messages are staged in the snapshot until the switch.
+
+        Parameters:
+            chat_id (:obj:`int` | :obj:`str`): Chat in which the datapacks are written.
+
+        Returns:
+            :obj:`None`
+        """
+        ids, pages, blobs, top_id = {}, {}, {}, 0
+        if self.__snapshot__:
+            self.__snapshot__.unstage()
+        for partition in self.__store__:
+            keys = partition.keys()
+            # a type with buckets is packed at once, the others are written in chunks
+            size = max(len(keys), 1) if partition.buckets else GET_MESSAGES_LIMIT
+            for i in range(0, len(keys), size):
+                datas, rows = {}, []
+                for key, record in (await self.__fetch_records__(partition, keys[i:i + size])).items():
+                    datas[key] = dict(record.data)
+                    for member, value in record.data.items():
+                        if isinstance(value, Blob):
+                            loaded = await self.__download_blob__(value)
+                            if loaded is not value:
+                                payload, digest = compress_value(loaded, self.__codec__)
+                                datas[key][member] = Blob(await self.__upload_blob__(payload, chat_id), digest)
+                                blobs[(partition.name, key)] = datas[key]
+                if partition.buckets:
+                    for bucket, contents in self.__pack__(partition, datas).items():
+                        for content in contents:
+                            text = self.__format_page__(partition, bucket, content)
+                            msg_id = await self.__send_message__(text, chat_id)
+                            pages[msg_id] = (partition, bucket, partition.page_digest(text))
+                            ids.update(((partition.name, key), msg_id) for key in content)
+                            rows.append((f"{_parse_page(text)[0]}{DP_NAME_SEPARATOR}{msg_id}", msg_id, text))
+                            top_id = max(top_id, msg_id)
+                else:
+                    for key, data in datas.items():
+                        text = self.__format_datapack__(partition, key, data)
+                        msg_id = await self.__send_message__(text, chat_id)
+                        ids[(partition.name, key)] = msg_id
+                        rows.append((self.__record_name__(partition, key), msg_id, text))
+                        top_id = max(top_id, msg_id)
+                if self.__snapshot__:
+                    self.__snapshot__.stage_many(rows)
+        # every datapack was written, the session switches to the new chat
+        subscribed = bool(self.__handlers__)
+        self.unsubscribe()
+        self.__chat_id__ = chat_id
+        self.__top_id__ = top_id
+        self.invalid_messages = []
+        for partition in self.__store__:
+            for page in list(partition.pages):
+                partition.remove_page(page)
+        for msg_id, (partition, bucket, digest) in pages.items():
+            partition.add_page(msg_id, bucket)
+            partition.page_digests[msg_id] = digest
+        for partition in self.__store__:
+            for key in partition.keys():
+                msg_id = ids.get((partition.name, key))
+                if msg_id is None:
+                    # deleted from the old chat while it was rewritten
+                    partition.pop(key)
+                elif (partition.name, key) in blobs:
+                    partition.set(key, msg_id, blobs[(partition.name, key)])
+                else:
+                    partition.set_id(key, msg_id)
+        if self.__snapshot__:
+            self.__snapshot__.reset(chat_id, top_id)
+        if subscribed:
+            await AsyncTelegramDB.subscribe(self, self.__handlers_group__)
+
+    async def __unpublish_data__(self, msg_ids: List[int]):
+        """
+        This method is used to delete message storage of the data from telegram database.
+
+        Parameters:
+            msg_ids (List of :obj:`int`): message ids of the stored datapack and its blobs to be deleted.
+
+        Returns:
+            :obj:`bool`
+        """
+        try:
+            if msg_ids:
+                await self.__delete_messages__(msg_ids)
+            return True
+        except Exception:
+            return False
+
+    async def __enqueue_data__(self, partition: Partition, key, datapack: DataPack, values: dict, data: str):
+        """
+        This method is used to save the committed data in the cache and queue it to be published by the background flusher.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapack.
+            key (:obj:`Any`): Primary key of the datapack.
+            datapack (:class:`DataPack`): Subclass of the `DataPack` of the data to be published on telegram database.
+            values (:obj:`dict`): Data of the datapack to be cached, with its blobs.
+            data (:obj:`str`): Formatted string of the data to be published on telegram database.
+
+        Returns:
+            :obj:`None`
+        """
+        pending_key = (partition.name, key)
+        if pending_key not in self.__pending__:
+            await self.__reserve_queue__()
+        partition.set(key, partition.get_id(key) or 0, values)
+        self.__pending__[pending_key] = data
+        if self.debug:
+            self.LOGGER.info(f"Queued: {datapack.__query_data__()}")
+
+    async def __reserve_queue__(self):
+        """
+        This method is used to make room in the write-behind queue and start the background flusher if it is not running.
+
+        Returns:
+            :obj:`None`
+        """
+        if len(self.__pending__) + len(self.__pending_deletes__) + len(self.__pending_pages__) >= self.max_queue_size:
+            await AsyncTelegramDB.flush(self)
+        if self.__flusher__ is None or self.__flusher__.done():
+            self.__flusher__ = asyncio.ensure_future(self.__flush_loop__())
+
+    async def __flush_loop__(self):
+        """
+        This method is used to flush the write-behind queue every ``flush_interval`` seconds, the failed writes are retried with the next flush.
+
+        Note:
+            The first error of the writes which were dropped is raised by the next :meth:`AsyncTelegramDB.flush` or :meth:`AsyncTelegramDB.close`.
+
+        Returns:
+            :obj:`None`
+        """
+        # a running flush may queue its failed writes again
+        while self.__pending__ or self.__pending_deletes__ or self.__pending_pages__ or self.__flush_lock__.locked():
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.__flush_queue__()
+            except Exception as error:
+                if not _is_retryable(error) and self.__flush_error__ is None:
+                    self.__flush_error__ = error
+                if self.debug:
+                    self.LOGGER.warning(f"Flush failed, retrying in {self.flush_interval}s: {error!r}")
+
+    @_on_session_loop
+    @instrumented("flush")
+    async def flush(self):
+        """
+        Use this method to publish all the pending writes of the write-behind queue on telegram.
+
+        Note:
+            Multiple commits of the same datapack are coalesced in a single message edit and the deletes are batched in a single request.
+            Every page of the types with buckets is edited at most once, a message deleted by someone else is sent again as a new one.
+            The writes which fail because of the network or a flood wait are queued again, the ones which fail for any other reason are dropped. The first error is raised after the other writes were published, including an error of a background flush which dropped writes.
+
+        Returns:
+            :obj:`None`
+        """
+        try:
+            await self.__flush_queue__()
+        finally:
+            error, self.__flush_error__ = self.__flush_error__, None
+        if error is not None:
+            raise error
+
+    async def __flush_queue__(self):
+        """
+        This method is used to publish the pending writes of the write-behind queue, the ones which can be retried are queued again if they fail.
+
+        Returns:
+            :obj:`None`
+        """
+        async with self.__flush_lock__:
+            pending, self.__pending__ = self.__pending__, {}
+            deletes, self.__pending_deletes__ = self.__pending_deletes__, set()
+            pages, self.__pending_pages__ = self.__pending_pages__, set()
+            single, bucketed = {}, {name: {} for name, _ in pages}
+            for pending_key, data in pending.items():
+                if self.__store__.partition(pending_key[0]).buckets:
+                    bucketed.setdefault(pending_key[0], {})[pending_key[1]] = data
+                else:
+                    single[pending_key] = data
+            results = await asyncio.gather(
+                *(self.__flush_data__(key, data) for key, data in single.items()),
+                *(self.__flush_pages__(name, texts, [page for page_name, page in pages if page_name == name]) for name, texts in bucketed.items()),
+                return_exceptions=True,
+            )
+            failures = [result for result in results if isinstance(result, BaseException)]
+            deletes.update(self.__pending_deletes__)
+            self.__pending_deletes__.clear()
+            if deletes:
+                if self.__snapshot__:
+                    self.__snapshot__.delete_ids(list(deletes))
+                try:
+                    await self.__delete_messages__(sorted(deletes))
+                except BaseException as error:
+                    if _is_retryable(error):
+                        self.__pending_deletes__.update(deletes)
+                    failures.append(error)
+                    if self.debug:
+                        self.LOGGER.warning(f"Failed to delete messages: {sorted(deletes)}")
+            if failures:
+                raise failures[0]
+
+    async def __flush_data__(self, pending_key: tuple, data: str):
+        """
+        This method is used to publish a single pending write of the write-behind queue.
+
+        Parameters:
+            pending_key (:obj:`tuple`): Name of the type and primary key of the datapack.
+            data (:obj:`str`): Formatted string of the data to be published on telegram database.
+
+        Returns:
+            :obj:`None`
+        """
+        partition = self.__store__.partition(pending_key[0])
+        key = pending_key[1]
+        msg_id = partition.get_id(key)
+        if msg_id is None:
+            return
+        try:
+            sent = await self.__edit_or_send__(msg_id, data) if msg_id else await self.__send_message__(data)
+        except BaseException as error:
+            if _is_retryable(error):
+                # a newer commit queued meanwhile is kept
+                self.__pending__.setdefault(pending_key, data)
+            if self.debug:
+                self.LOGGER.warning(f"Failed to publish: {self.__record_name__(partition, key)}")
+            raise
+        if sent == msg_id:
+            if self.__snapshot__:
+                self.__snapshot__.save(self.__record_name__(partition, key), msg_id, data)
+        elif partition.get_id(key) == msg_id:
+            partition.set_id(key, sent)
+            if self.__snapshot__:
+                self.__snapshot__.save(self.__record_name__(partition, key), sent, data)
+        else:
+            # deleted while it was being sent
+            self.__pending_deletes__.add(sent)
+
+    async def __flush_pages__(self, name: str, texts: dict, pages: List[int]):
+        """
+        This method is used to publish the pending writes of a type with buckets of the write-behind queue.
+
+        Parameters:
+            name (:obj:`str`): Name of the type.
+            texts (:obj:`dict`): Formatted strings of the datapacks mapped by their primary key.
+            pages (List of :obj:`int`): Message ids of the pages which lost a datapack.
+
+        Returns:
+            :obj:`None`
+        """
+        partition = self.__store__.partition(name)
+        datas = {}
+        for key, text in texts.items():
+            if partition.get_id(key) is not None:
+                datas[key] = _parse_datapacks([(0, text)])[0][3]
+        try:
+            msg_ids = await self.__write_pages__(partition, datas, pages)
+        except BaseException as error:
+            if _is_retryable(error):
+                for key, text in texts.items():
+                    self.__pending__.setdefault((name, key), text)
+                self.__pending_pages__.update((name, page) for page in pages)
+            if self.debug:
+                self.LOGGER.warning(f"Failed to publish the pages of: {name}")
+            raise
+        for key, msg_id in msg_ids.items():
+            if partition.get_id(key) is None:
+                # deleted while it was being written
+                self.__pending_pages__.add((name, msg_id))
+            else:
+                partition.set_id(key, msg_id)
+
+    @_on_session_loop
+    async def close(self):
+        """
+        Use this method to stop the background flusher after publishing all the pending writes.
+
+        Note:
+            A flush which is running is awaited before the flusher is stopped, so its writes aren't cancelled.
+
+        Returns:
+            :obj:`None`
+        """
+        if self.__flusher__ is not None:
+            async with self.__flush_lock__:
+                self.__flusher__.cancel()
+            self.__flusher__ = None
+        self.unsubscribe()
+        await AsyncTelegramDB.flush(self)
+
+    async def __send_message__(self, text: str, chat_id: Union[int, str]=None):
+        """
+        This method is used to send a new message to the telegram database chat.
+
+        Parameters:
+            text (:obj:`str`): Text of the message.
+            chat_id (:obj:`int` | :obj:`str`, Optional): Another chat to send the message to.
+
+        Returns:
+            :obj:`int`: Message id of the sent message.
+        """
+        chat_id = self.__chat_id__ if chat_id is None else chat_id
+        return await self.__scheduler__.call(chat_id, self.__backend__.send, chat_id, text)
+
+    async def __edit_message__(self, msg_id: int, text: str):
+        """
+        This method is used to edit the text of a message of the telegram database chat.
+
+        Parameters:
+            msg_id (:obj:`int`): Message id of the message to be edited.
+            text (:obj:`str`): New text of the message.
+
+        Returns:
+            :obj:`None`
+        """
+        await self.__scheduler__.call(self.__chat_id__, self.__backend__.edit, self.__chat_id__, msg_id, text)
+
+    async def __edit_or_send__(self, msg_id: int, text: str):
+        """
+        This method is used to edit the text of a message of the telegram database chat, it is sent again as a new message if it was deleted by someone else.
+
+        Parameters:
+            msg_id (:obj:`int`): Message id of the message to be edited.
+            text (:obj:`str`): New text of the message.
+
+        Returns:
+            :obj:`int`: Message id of the message with the new text.
+        """
+        try:
+            await self.__edit_message__(msg_id, text)
+            return msg_id
+        except MessageIdInvalid:
+            if self.debug:
+                self.LOGGER.warning(f"Message id '{msg_id}' of the database chat was deleted, sending it again")
+            return await self.__send_message__(text)
+
+    async def __delete_messages__(self, msg_ids: List[int]):
+        """
+        This method is used to delete messages from the telegram database chat.
+
+        Parameters:
+            msg_ids (List of :obj:`int`): Message ids of the messages to be deleted.
+
+        Returns:
+            :obj:`None`
+        """
+        for i in range(0, len(msg_ids), DELETE_MESSAGES_LIMIT):
+            await self.__scheduler__.call(self.__chat_id__, self.__backend__.delete, self.__chat_id__, msg_ids[i:i + DELETE_MESSAGES_LIMIT])
+
+    def __format_datapack__(self, partition: Partition, key, data: dict):
+        """
+        This method is used to format the data of a :class:`DataPack` in a string which will be published on telegram database chat.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapack.
+            key (:obj:`Any`): Primary key of the datapack.
+            data (:obj:`dict`): Data of the datapack to be published on telegram database.
+
+        Returns:
+            :obj:`str`
+        """
+        query = f"#{self.__record_name__(partition, key)}"
+        query += f"\n{encode_data(dump_blobs(data), self.__codec__)}"
+        return query
+
+    async def __upload_blob__(self, payload: bytes, chat_id: Union[int, str]=None):
+        """
+        This method is used to upload the compressed value of a blob as a document to the telegram database chat.
+
+        Parameters:
+            payload (:obj:`bytes`): Compressed value.
+            chat_id (:obj:`int` | :obj:`str`, Optional): Another chat to upload the document to.
+
+        Returns:
+            :obj:`int`: Message id of the document.
+        """
+        chat_id = self.__chat_id__ if chat_id is None else chat_id
+        document = BytesIO(payload)
+        document.name = "datapack.zlib"
+        return await self.__scheduler__.call(chat_id, self.__backend__.send_document, chat_id, document)
+
+    async def __download_blob__(self, blob: Blob):
+        """
+        This method is used to download the value of a blob, the document is decompressed while it is streamed.
+
+        Parameters:
+            blob (:class:`Blob`): Blob to be downloaded.
+
+        Returns:
+            The value of the blob, the blob itself if its document was deleted.
+        """
+        document = await self.__scheduler__.read(self.__chat_id__, self.__backend__.stream_document, self.__chat_id__, blob.msg_id)
+        if document is None:
+            return blob
+        decompressor = zlib.decompressobj()
+        chunks = []
+
+        async def stream():
+            async for chunk in document:
+                chunks.append(decompressor.decompress(chunk))
+
+        await self.__scheduler__.read(self.__chat_id__, stream)
+        chunks.append(decompressor.flush())
+        return decode_value(b"".join(chunks))
+
+    @instrumented("load")
+    async def __get_datapacks__(self):
+        """
+        This method is used to load the existing data from the telegram database chat.
+
+        Note:
+            Messages that can't be parsed are skipped and their ids are recorded in ``invalid_messages``.
+
+        Returns:
+            :obj:`None`
+        """
+        max_id = 0
+        if self.__snapshot__:
+            max_id, rows = self.__snapshot__.load(self.__chat_id__)
+            while True:
+                # a chunk at a time, the cache evicts down to cache_size meanwhile
+                chunk = list(islice(rows, SNAPSHOT_CHUNK_SIZE))
+                if not chunk:
+                    break
+                self.__apply_parsed__(_parse_datapacks([(msg_id, text) for _, msg_id, text in chunk]))
+                if self.verify_snapshot:
+                    await self.__verify_snapshot__({msg_id: (name, text) for name, msg_id, text in chunk})
+            interrupted = self.__snapshot__.get_load()
+            if interrupted:
+                # resume the load which was interrupted before loading anything newer
+                await self.__load_history__(max_id, *interrupted)
+                max_id = interrupted[0]
+        top_id = await self.__get_top_id__()
+        if top_id > max_id:
+            if self.__snapshot__:
+                self.__snapshot__.begin_load(top_id)
+            await self.__load_history__(max_id, top_id, set())
+        self.__top_id__ = max(max_id, top_id)
+
+    async def __load_history__(self, min_id: int, top_id: int, completed: set):
+        """
+        This method is used to load the messages of the telegram database chat in windows of ``GET_MESSAGES_LIMIT`` ids fetched concurrently.
+
+        Parameters:
+            min_id (:obj:`int`): Only the messages with an id higher than this are loaded.
+            top_id (:obj:`int`): Highest message id to be loaded.
+            completed (:obj:`set`): First message id of the windows already loaded by an interrupted load.
+
+        Returns:
+            :obj:`None`
+        """
+        starts = range(min_id + 1, top_id + 1, GET_MESSAGES_LIMIT)
+        total = len(starts)
+        done = len(completed)
+        semaphore = asyncio.Semaphore(self.load_concurrency)
+
+        async def load_window(start: int):
+            nonlocal done
+            async with semaphore:
+                messages = await self.__get_messages__(list(range(start, min(start + GET_MESSAGES_LIMIT, top_id + 1))))
+            messages = [(msg_id, text) for msg_id, text in messages if text]
+            if self.__executor__:
+                parsed = await asyncio.get_event_loop().run_in_executor(self.__executor__, _parse_datapacks, messages)
+            else:
+                parsed = _parse_datapacks(messages)
+            rows = self.__apply_parsed__(parsed)
+            if self.__snapshot__:
+                self.__snapshot__.complete_window(start, rows)
+            done += 1
+            if self.progress:
+                self.progress(done, total)
+
+        await asyncio.gather(*(load_window(start) for start in starts if start not in completed))
+        if self.__snapshot__:
+            self.__snapshot__.finish_load()
+
+    def __apply_parsed__(self, parsed: List[tuple]):
+        """
+        This method is used to save the parsed messages in the cache, the newest message of a datapack wins.
+
+        Parameters:
+            parsed (List of :obj:`tuple`): ``(message id, text, name, data)`` tuples returned by ``_parse_datapacks``.
+
+        Returns:
+            A list of ``(name, message id, text)`` tuples of the datapacks which were saved.
+        """
+        rows, last_page = [], None
+        for msg_id, text, name, data in parsed:
+            if name is None:
+                self.invalid_messages.append(msg_id)
+                if self.debug:
+                    self.LOGGER.warning(f"Skipped an invalid DataPack at message id '{msg_id}' of the database chat")
+                continue
+            partition, key = self.__resolve_name__(name, data)
+            page = _parse_page(text)
+            if page:
+                partition.add_page(msg_id, page[1])
+                if last_page != msg_id:
+                    partition.set_page_text(msg_id, text)
+                    last_page = msg_id
+            old_id = partition.get_id(key)
+            if old_id is None or old_id <= msg_id:
+                partition.set(key, msg_id, data)
+                row = (f"{page[0]}{DP_NAME_SEPARATOR}{msg_id}", msg_id, text) if page else (name, msg_id, text)
+                if not rows or rows[-1] != row:
+                    rows.append(row)
+        return rows
+
+    async def __verify_snapshot__(self, rows: dict):
+        """
+        This method is used to apply the edits and deletes of the messages stored in the snapshot.
+
+        Parameters:
+            rows (:obj:`dict`): Name and text of the datapacks in the snapshot, mapped by their message id.
+
+        Returns:
+            :obj:`None`
+        """
+        msg_ids = sorted(rows)
+        semaphore = asyncio.Semaphore(self.load_concurrency)
+
+        async def get_chunk(chunk: List[int]):
+            async with semaphore:
+                return await self.__get_messages__(chunk)
+
+        chunks = [msg_ids[i:i + GET_MESSAGES_LIMIT] for i in range(0, len(msg_ids), GET_MESSAGES_LIMIT)]
+        changed, edited = [], []
+        for messages in await asyncio.gather(*(get_chunk(chunk) for chunk in chunks)):
+            for msg_id, text in messages:
+                name, old_text = rows[msg_id]
+                if text == old_text:
+                    continue
+                changed.append(msg_id)
+                for _, _, old_name, old_data in _parse_datapacks([(msg_id, old_text)]):
+                    partition, key = self.__resolve_name__(old_name, old_data)
+                    if partition.get_id(key) == msg_id:
+                        partition.pop(key)
+                    if text is None:
+                        partition.remove_page(msg_id)
+                if text is not None:
+                    edited += self.__apply_parsed__(_parse_datapacks([(msg_id, text)]))
+        if changed:
+            self.__snapshot__.delete_ids(changed)
+            self.__snapshot__.save_many(edited)
+
+    async def __get_top_id__(self):
+        """
+        This method is used to get the id of the newest message of the telegram database chat.
+
+        Returns:
+            :obj:`int`: Id of the newest message, ``0`` if the chat is empty.
+        """
+        async def get_top_id():
+            async for msg_id, _ in self.__backend__.iter_history(self.__chat_id__, limit=1):
+                return msg_id
+            return 0
+        return await self.__scheduler__.read(self.__chat_id__, get_top_id)
+
+    async def __get_messages__(self, msg_ids: List[int]):
+        """
+        This method is used to get messages of the telegram database chat by their ids.
+
+        Parameters:
+            msg_ids (List of :obj:`int`): Message ids, at most ``GET_MESSAGES_LIMIT`` of them.
+
+        Returns:
+            A list of ``(message id, text)`` tuples, the text is ``None`` for deleted or non-text messages.
+        """
+        return await self.__scheduler__.read(self.__chat_id__, self.__backend__.get_by_ids, self.__chat_id__, msg_ids)
+    
+    async def __make_chat__(self):
+        """
+        This method is used to make the telegram database chat if not provided.
+
+        Returns:
+            :obj:`None`
+        """
+        self.__chat_id__ = await self.__scheduler__.call(None, self.__backend__.create_chat, "Telegram DB")
+    
+class Transaction:
+    """
+    Commits staged in a block, they are saved together with :meth:`TelegramDB.commit_many` when it exits without errors.
+    Use :meth:`TelegramDB.transaction` to create it, ``async with`` for :class:`AsyncTelegramDB` and ``with`` for :class:`TelegramDB`.
+
+    Parameters:
+        session (:class:`AsyncTelegramDB`): Session where the datapacks are committed.
+
+    Attributes:
+        datapacks (List of :class:`DataPack`): Staged datapacks.
+
+    Example:
+        .. code-block:: python
+
+            with SESSION.transaction() as transaction:
+                transaction.commit(User(1, "a"))
+                transaction.commit(User(2, "b"))
+    """
+    def __init__(self, session: AsyncTelegramDB):
+        self.__session__ = session
+        self.datapacks: List[DataPack] = []
+
+    def commit(self, datapack: DataPack):
+        """
+        Use this method to stage a datapack to be committed when the block exits.
+
+        Parameters:
+            datapack (:class:`DataPack`): Subclass of the `DataPack` of the data to be saved on telegram.
+
+        Returns:
+            :obj:`None`
+        """
+        self.datapacks.append(datapack)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None and self.datapacks:
+            await AsyncTelegramDB.commit_many(self.__session__, self.datapacks)
+
+    def __enter__(self):
+        if not isinstance(self.__session__, TelegramDB):
+            raise TypeError("Use 'async with' for the transactions of AsyncTelegramDB")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None and self.datapacks:
+            self.__session__.commit_many(self.datapacks)
+
+class TelegramDB(AsyncTelegramDB):
+    """
+    Main object which initialises the telegram database session.
+
+    Note:
+        This is a synchronous wrapper around :class:`AsyncTelegramDB`, use the latter inside of async handlers to avoid blocking the event loop.
+
+    Parameters:
+        telegram_client (:class:`pyrogram.Client` | :class:`telethon.TelegramClient` | :class:`Backend`): Telegram client which will be used to save database queries on telegram, or a :class:`Backend` such as :class:`MemoryBackend`.
+        chat_id (:obj:`int` | :obj:`str`): Unique identifier for the target chat or username of the target channel (in the format ``@channelusername``).
+        debug (:obj:`bool`, Optional): Database queries will be debugged if it is set to ``True``.
+        logger (:class:`logging.Logger`, Optional): Logger which will be used for debugging.
+        write_behind (:obj:`bool`, Optional): Commits and deletes are applied to the cache immediately and published on telegram in the background if it is set to ``True``.
+        flush_interval (:obj:`float`, Optional): Seconds between two background flushes of the write-behind queue.
+        max_queue_size (:obj:`int`, Optional): Maximum number of pending writes, the queue is flushed before accepting more.
+        scheduler (:class:`Scheduler`, Optional): Scheduler which paces and retries the requests sent to telegram, a new one is used if not provided.
+        snapshot (:obj:`str` | :class:`Snapshot`, Optional): Path of a local snapshot of the database chat, only the messages newer than the snapshot are loaded from telegram on start.
+        verify_snapshot (:obj:`bool`, Optional): Messages of the snapshot are checked for edits and deletes on start, which fetches them again in chunks. Set it to ``False`` to load only the messages newer than the snapshot, when no other session edits or deletes the datapacks while this one is stopped, otherwise their edits and deletes are missed.
+        load_concurrency (:obj:`int`, Optional): Maximum number of windows of messages fetched at the same time while loading the database chat.
+        executor (:class:`concurrent.futures.Executor`, Optional): Executor used to parse the loaded messages, e.g. a :class:`concurrent.futures.ProcessPoolExecutor`. They are parsed on the event loop if not provided.
+        progress (:obj:`Callable`, Optional): Function called with the number of completed and total windows of messages while loading the database chat.
+        codec (:class:`Codec`, Optional): Codec used to write the data in the messages, :class:`JSONCodec` if not provided. Messages written with any registered codec are readable.
+        cache_size (:obj:`int`, Optional): Maximum number of datapacks of every type kept in memory, the least recently used ones are evicted and fetched again by their message id when needed. All of them are kept if not provided.
+        cache_ttl (:obj:`float`, Optional): Seconds after which a cached datapack is evicted, they don't expire if not provided.
+        metrics (:class:`Metrics`, Optional): Registry in which the latency of the operations, the requests sent to telegram and the cache hits are recorded, nothing is recorded if not provided.
+    
+    Example:
+        .. code-block:: python
+
+            from telegramdb import TelegramDB
+            from pyrogram import Client
+
+            client = Client(
+                "my_account",
+                api_id=12345,
+                api_hash="0123456789abcdef0123456789abcdef"
+            )
+            chat_id = 777000
+            SESSION = TelegramDB(client, chat_id)
+    """
+    def __init__(self, telegram_client: Union["Client", "TelegramClient", Backend], chat_id: Union[int, str]=None, debug: bool=False, logger: Logger=None, write_behind: bool=False, flush_interval: float=1.0, max_queue_size: int=1000, scheduler: Scheduler=None, snapshot: Union[str, Snapshot]=None, verify_snapshot: bool=True, load_concurrency: int=4, executor: Executor=None, progress: Callable[[int, int], None]=None, codec: Codec=None, cache_size: int=None, cache_ttl: float=None, metrics: Metrics=None):
+        super().__init__(
+            telegram_client, chat_id, debug, logger,
+            write_behind=write_behind, flush_interval=flush_interval, max_queue_size=max_queue_size,
+            scheduler=scheduler, snapshot=snapshot, verify_snapshot=verify_snapshot,
+            load_concurrency=load_concurrency, executor=executor, progress=progress, codec=codec,
+            cache_size=cache_size, cache_ttl=cache_ttl, metrics=metrics,
+        )
+        self.__run_lock__ = threading.Lock()
+        self.__driving__ = False
+        self.__submitted__: set = set()
+        self.__run__(self.start())
+
+    def commit(self, datapack: DataPack):
+        """
+        Use this method to save the data on telegram database.
+
+        Parameters:
+            datapack (:class:`DataPack`): Subclass of the `DataPack` of the data to be saved on telegram.
+
+        Returns:
+            :obj:`None`
+        """
+        return self.__run__(super().commit(datapack))
+
+    def commit_many(self, datapacks: List[DataPack]):
+        """
+        Use this method to save many datapacks on telegram database at once.
+
+        Parameters:
+            datapacks (List of :class:`DataPack`): Subclasses of the `DataPack` of the data to be saved on telegram, the last one wins if two of them have the same primary key.
+
+        Returns:
+            :obj:`None`
+        """
+        return self.__run__(super().commit_many(datapacks))
+
+    @instrumented("get")
+    def get(self, datapack: DataPack):
+        """
+        Use this method to get the data from telegram database.
+
+        Parameters:
+            datapack (:obj:`DataPack`): Object of the `DataPack` of the data to be retrieved from telegram database.
+
+        Note:
+            A cached datapack is read directly when no other thread runs the event loop of the session, otherwise it's read on that loop.
+
+        Returns:
+            :obj:`bool`
+        """
+        if _running_loop() is self.__loop__:
+            found = self.__get_cached__(datapack)
+        else:
+            with self.__run_lock__:
+                idle = not (self.__driving__ or self.__loop__.is_running())
+                found = self.__get_cached__(datapack) if idle else None
+        if found is None:
+            return self.__run__(self.__get_datapack__(datapack))
+        return found
+
+    def __get_cached__(self, datapack: DataPack):
+        """
+        This method is used to fill a datapack from the cache without awaiting telegram.
+
+        Parameters:
+            datapack (:obj:`DataPack`): Object of the `DataPack` of the data to be retrieved.
+
+        Returns:
+            :obj:`bool`: ``None`` if the datapack has to be fetched or its blobs downloaded.
+        """
+        partition, key = self.__key_of__(datapack)
+        record = self.__get_record__(partition, key)
+        if record is None and key not in partition.evicted:
+            return False
+        if record is None or any(isinstance(value, Blob) for value in record.data.values()):
+            return None
+        datapack.__set_dict__(record.data)
+        return True
+
+    def get_all(self):
+        """
+        Use this method to get all data from telegram database.
+
+        Returns:
+            A list containing elements of object :class:`DataPack`
+        """
+        return self.__run__(super().get_all())
+
+    def __read_evicted__(self, partition: Partition, keys: list):
+        """
+        This method is used to fetch the evicted datapacks of a query iterated with ``for``.
+
+        Parameters:
+            partition (:class:`Partition`): Partition of the type of the datapacks.
+            keys (:obj:`list`): Primary keys of the evicted datapacks.
+
+        Returns:
+            :obj:`dict`: Records of the stored datapacks mapped by their primary key.
+        """
+        return self.__run__(self.__fetch_records__(partition, keys))
+
+    def find(self, datapack_class: type, **members):
+        """
+        Use this method to find the datapacks by the values of their members, indexed members are looked up in their index.
+
+        Parameters:
+            datapack_class (:obj:`type`): Subclass of the `DataPack` to be found, prepared with :meth:`TelegramDB.prepare_datapack`.
+            **members: Values of the members to be matched.
+
+        Returns:
+            A list containing elements of object ``datapack_class``
+
+        Example:
+            .. code-block:: python
+
+                users = SESSION.find(User, username="telegram")
+        """
+        return self.__run__(super().find(datapack_class, **members))
+
+    def delete(self, datapack: DataPack):
+        """
+        Use this method to delete data from telegram database.
+
+        Parameters:
+            datapack (:obj:`DataPack`): Object of the `DataPack` of the data to be retrieved from telegram database.
+
+        Returns:
+            :obj:`bool`
+        """
+        return self.__run__(super().delete(datapack))
+
+    def subscribe(self, group: int=-1):
+        """
+        Use this method to keep the session in sync with the other sessions of the same database chat, the new, edited and deleted messages of the chat are applied to the cache as they come.
+
+        Parameters:
+            group (:obj:`int`, Optional): Group of the handlers of a :class:`pyrogram.Client`.
+
+        Returns:
+            :obj:`None`
+        """
+        return self.__run__(super().subscribe(group))
+
+    def export(self, fp: TextIO):
+        """
+        Use this method to write every datapack in a file as JSON Lines, see :meth:`AsyncTelegramDB.export`.
+
+        Parameters:
+            fp (:obj:`TextIO`): File opened in text mode in which the datapacks are written.
+
+        Returns:
+            :obj:`int`
+        """
+        return self.__run__(super().export(fp))
+
+    def import_(self, fp: TextIO, batch_size: int=100, checkpoint: str=None):
+        """
+        Use this method to commit the datapacks written by :meth:`TelegramDB.export`, see :meth:`AsyncTelegramDB.import_`.
+
+        Parameters:
+            fp (:obj:`TextIO`): File opened in text mode from which the datapacks are read.
+            batch_size (:obj:`int`, Optional): Number of datapacks committed at once.
+            checkpoint (:obj:`str`, Optional): Path of a file in which the number of imported lines is saved after every batch.
+
+        Returns:
+            :obj:`int`
+        """
+        return self.__run__(super().import_(fp, batch_size, checkpoint))
+
+    def compact(self, chat_id: Union[int, str]=None, new_chat: bool=False):
+        """
+        Use this method to remove the messages of the database chat which don't store any datapack and to pack the datapacks of the types with buckets in as few pages as they fit, see :meth:`AsyncTelegramDB.compact`.
+
+        Parameters:
+            chat_id (:obj:`int` | :obj:`str`, Optional): Chat in which the datapacks are rewritten, it should be empty.
+            new_chat (:obj:`bool`, Optional): The datapacks are rewritten in a new channel if it is set to ``True``.
+
+        Returns:
+            :obj:`dict`
+        """
+        return self.__run__(super().compact(chat_id, new_chat))
+
+    def flush(self):
+        """
+        Use this method to publish all the pending writes of the write-behind queue on telegram.
+
+        Returns:
+            :obj:`None`
+        """
+        return self.__run__(super().flush())
+
+    def close(self):
+        """
+        Use this method to stop the background flusher after publishing all the pending writes.
+
+        Returns:
+            :obj:`None`
+        """
+        return self.__run__(super().close())
+
+    def __run__(self, coroutine):
+        """
+        This method is used to run a coroutine of :class:`AsyncTelegramDB` until it is complete.
+
+        Note:
+            If it is called from a coroutine already running on the event loop of the client, the loop is patched with ``nest_asyncio`` to allow it.
+            Use :class:`AsyncTelegramDB` there instead to avoid blocking the other handlers.
+            Calls from other threads are submitted to the loop while it is running, otherwise the calling thread runs it until its own coroutine and the ones submitted meanwhile are complete.
+
+        Parameters:
+            coroutine (:obj:`Coroutine`): Coroutine to be run.
+
+        Returns:
+            Result of the coroutine.
+        """
+        loop = self.__loop__
+        if _running_loop() is loop:
+            import nest_asyncio
+            nest_asyncio.apply(loop)
+            return loop.run_until_complete(coroutine)
+        with self.__run_lock__:
+            drive = not (self.__driving__ or loop.is_running())
+            if drive:
+                self.__driving__ = True
+            else:
+                future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+                self.__submitted__.add(future)
+        if not drive:
+            try:
+                return future.result()
+            finally:
+                with self.__run_lock__:
+                    self.__submitted__.discard(future)
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            # the loop keeps running for the coroutines submitted by other threads
+            while True:
+                with self.__run_lock__:
+                    pending = [future for future in self.__submitted__ if not future.done()]
+                    if not pending:
+                        self.__driving__ = False
+                        break
+                loop.run_until_complete(asyncio.wait([asyncio.wrap_future(future, loop=loop) for future in pending]))
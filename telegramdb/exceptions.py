@@ -21,8 +21,8 @@ class GeneralException(Exception):
         super().__init__(message)
 
 class ReservedCharacter(GeneralException):
-    def __init__(self, name:str = None):
-        super().__init__(f"Reserved Characters: '{DP_NAME_SEPARATOR}' can not be used in the datapack name: '{name}'")
+    def __init__(self, name:str = None, characters: str = DP_NAME_SEPARATOR):
+        super().__init__(f"Reserved Characters: '{characters}' can not be used in the datapack name: '{name}'")
 
 class InvalidDataPack(GeneralException):
     def __init__(self, message_id: int=None):
@@ -31,6 +31,14 @@ class InvalidDataPack(GeneralException):
             msg += f": Found an invalid DataPack at message id '{message_id}' of the database chat"
         super().__init__(msg)
 
+class UniqueViolation(GeneralException):
+    def __init__(self, member: str, value=None):
+        super().__init__(f"Unique Violation: value '{value}' of the unique member '{member}' is already used by another datapack")
+
+class UnknownCodec(GeneralException):
+    def __init__(self, tag: str):
+        super().__init__(f"Unknown Codec: no codec is registered with the tag '{tag}'")
+
 class UnsupportedClient(GeneralException):
     def __init__(self, message=None):
         msg = "Unsupported Client"
@@ -40,4 +48,29 @@ class UnsupportedClient(GeneralException):
 
 class InvalidClient(GeneralException):
     def __init__(self):
-        super().__init__("Invalid Client: provided client not valid")
\ No newline at end of file
+        super().__init__("Invalid Client: provided client not valid")
+
+class FloodWait(GeneralException):
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        super().__init__(f"Flood Wait: a wait of {seconds} seconds is required before the next request")
+
+class LimitExceeded(GeneralException):
+    def __init__(self, limit: str, value: int, maximum: int):
+        super().__init__(f"Limit Exceeded: {value} {limit} are more than the maximum of {maximum}")
+
+class MessageIdInvalid(GeneralException):
+    def __init__(self, message_id: int=None):
+        super().__init__(f"Message Id Invalid: the message id '{message_id}' doesn't exist in the chat")
+
+class InvalidMemberType(GeneralException):
+    def __init__(self, member: str, value=None, datatype: type=None):
+        super().__init__(f"Invalid Member Type: member '{member}' of type '{getattr(datatype, '__name__', datatype)}' can't store the value '{value}' of type '{type(value).__name__}'")
+
+class EvictedDataPack(GeneralException):
+    def __init__(self, name: str, count: int=1):
+        super().__init__(f"Evicted DataPack: {count} datapacks of the type '{name}' are evicted and can't be read without telegram, iterate the query with 'async for'")
+
+class UnpreparedDataPack(GeneralException):
+    def __init__(self, name: str):
+        super().__init__(f"Unprepared DataPack: the type '{name}' must be prepared with prepare_datapack before its datapacks are imported")
@@ -0,0 +1,166 @@
+# TelegramDB
+# Copyright (C) 2023
+# Anony <github.com/anonyindian>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Iterator, List, Set
+
+__all__ = ["HashIndex", "SortedIndex"]
+
+def freeze(value: Any):
+    """
+    Returns a hashable version of a value stored in a :class:`DataPack`, lists and dicts are converted to tuples.
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+def sort_key(value: Any):
+    """
+    Returns a key which orders the values stored in a :class:`DataPack`, ``None`` first, then numbers, strings and the other values grouped by their type.
+    """
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, type(value).__name__, freeze(value))
+
+class HashIndex:
+    """
+    In-memory hash index of a :class:`Member`, it maps every value of the member to the primary keys of the datapacks which have it.
+
+    Parameters:
+        member (:obj:`str`): Name of the indexed member.
+        unique (:obj:`bool`, Optional): Whether two datapacks can't have the same value of the member.
+    """
+    def __init__(self, member: str, unique: bool=False):
+        self.member = member
+        self.unique = unique
+        self.__entries__: Dict[Any, Set[Any]] = {}
+
+    def add(self, key: Any, value: Any):
+        """
+        Adds a datapack to the index.
+
+        Parameters:
+            key (:obj:`Any`): Primary key of the datapack.
+            value (:obj:`Any`): Value of the member.
+
+        Returns:
+            :obj:`None`
+        """
+        self.__entries__.setdefault(freeze(value), set()).add(key)
+
+    def remove(self, key: Any, value: Any):
+        """
+        Removes a datapack from the index.
+
+        Parameters:
+            key (:obj:`Any`): Primary key of the datapack.
+            value (:obj:`Any`): Value of the member.
+
+        Returns:
+            :obj:`None`
+        """
+        value = freeze(value)
+        keys = self.__entries__.get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.__entries__[value]
+
+    def get(self, value: Any):
+        """
+        Returns the primary keys of the datapacks which have the given value of the member.
+
+        Parameters:
+            value (:obj:`Any`): Value of the member.
+
+        Returns:
+            :obj:`set`
+        """
+        return self.__entries__.get(freeze(value), set())
+
+    def clear(self):
+        """
+        Removes all the datapacks from the index.
+
+        Returns:
+            :obj:`None`
+        """
+        self.__entries__.clear()
+
+class SortedIndex(HashIndex):
+    """
+    In-memory index of a :class:`Member` which also keeps the datapacks sorted by the value of the member, it can be scanned by range and in order.
+
+    Note:
+        Datapacks with the same value are sorted by their primary key, so every datapack has a stable position which can be used as a cursor.
+        Values are compared as they are written in the message, e.g. datetimes as ISO strings.
+
+    Parameters:
+        member (:obj:`str`): Name of the indexed member.
+        unique (:obj:`bool`, Optional): Whether two datapacks can't have the same value of the member.
+    """
+    def __init__(self, member: str, unique: bool=False):
+        super().__init__(member, unique)
+        self.__sorted__: List[tuple] = []
+
+    def add(self, key: Any, value: Any):
+        super().add(key, value)
+        insort(self.__sorted__, (sort_key(value), sort_key(key), key))
+
+    def remove(self, key: Any, value: Any):
+        super().remove(key, value)
+        entry = (sort_key(value), sort_key(key), key)
+        position = bisect_left(self.__sorted__, entry)
+        if position < len(self.__sorted__) and self.__sorted__[position] == entry:
+            del self.__sorted__[position]
+
+    def range(self, low: Any=None, high: Any=None, reverse: bool=False, after: tuple=None) -> Iterator[Any]:
+        """
+        Returns the primary keys of the datapacks with a value of the member between the given ones, in order.
+
+        Parameters:
+            low (:obj:`Any`, Optional): Lowest value, included. The scan starts from the first datapack if not provided.
+            high (:obj:`Any`, Optional): Highest value, included. The scan ends with the last datapack if not provided.
+            reverse (:obj:`bool`, Optional): The datapacks are scanned from the highest value if it is set to ``True``.
+            after (:obj:`tuple`, Optional): ``(value, primary key)`` of the datapack after which the scan starts, in the order of the scan.
+
+        Returns:
+            An iterator of primary keys.
+        """
+        start = 0 if low is None else bisect_left(self.__sorted__, (sort_key(low),))
+        # (4,) sorts after the key of any primary key
+        end = len(self.__sorted__) if high is None else bisect_left(self.__sorted__, (sort_key(high), (4,)))
+        if after is not None:
+            cursor = (sort_key(after[0]), sort_key(after[1]), after[1])
+            if reverse:
+                end = min(end, bisect_left(self.__sorted__, cursor))
+            else:
+                start = max(start, bisect_right(self.__sorted__, cursor))
+        for position in (range(end - 1, start - 1, -1) if reverse else range(start, end)):
+            if position < len(self.__sorted__):
+                yield self.__sorted__[position][2]
+
+    def clear(self):
+        super().clear()
+        self.__sorted__.clear()
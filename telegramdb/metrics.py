@@ -0,0 +1,260 @@
+# TelegramDB
+# Copyright (C) 2023
+# Anony <github.com/anonyindian>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import inspect
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Tuple
+
+__all__ = ["Histogram", "Metrics", "instrumented"]
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+def _escape_label(value: str):
+    """
+    Escapes a label value of the text exposition format of Prometheus.
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Histogram:
+    """
+    Histogram of observed values, e.g. latencies in seconds.
+
+    Parameters:
+        buckets (Iterable of :obj:`float`): Upper bounds of the buckets, sorted.
+
+    Attributes:
+        counts (List of :obj:`int`): Observations of every bucket, the last one counts the values above every bound.
+        sum (:obj:`float`): Sum of the observed values.
+        count (:obj:`int`): Number of observed values.
+    """
+    def __init__(self, buckets: Iterable[float]=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """
+        Adds a value to the histogram.
+
+        Returns:
+            :obj:`None`
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float):
+        """
+        Returns the upper bound of the bucket of a quantile, ``inf`` if it is above every bound and ``None`` if nothing was observed.
+
+        Parameters:
+            q (:obj:`float`): Quantile between ``0`` and ``1``, e.g. ``0.99``.
+        """
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class Metrics:
+    """
+    Registry of the counters, histograms and gauges of a :class:`TelegramDB` session.
+
+    Note:
+        Every metric is kept per set of labels, e.g. the latency of ``commit`` and ``get`` are two series of ``telegramdb_operation_seconds``.
+        The same registry can be shared by many sessions, the gauges of the last session which registered them are reported.
+
+    Attributes:
+        counters (:obj:`dict`): Values of the counters mapped by their name and labels.
+        histograms (:obj:`dict`): :class:`Histogram` of the observed values mapped by their name and labels.
+        gauges (:obj:`dict`): Functions returning the current value of the gauges mapped by their name.
+
+    Example:
+        .. code-block:: python
+
+            from telegramdb import AsyncTelegramDB, Metrics
+
+            metrics = Metrics()
+            metrics.add_hook(lambda name, value, labels: print(name, value, labels))
+            SESSION = await AsyncTelegramDB(client, chat_id, metrics=metrics).start()
+            print(metrics.export_prometheus())
+    """
+    def __init__(self, buckets: Iterable[float]=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters: Dict[Tuple[str, tuple], float] = {}
+        self.histograms: Dict[Tuple[str, tuple], Histogram] = {}
+        self.gauges: Dict[str, Callable[[], float]] = {}
+        self.__hooks__: List[Callable[[str, float, dict], None]] = []
+
+    def add_hook(self, hook: Callable[[str, float, dict], None]):
+        """
+        Registers a function called with the name, the value and the labels of every counted or observed value, e.g. to forward them to a tracer.
+
+        Returns:
+            :obj:`None`
+        """
+        self.__hooks__.append(hook)
+
+    def remove_hook(self, hook: Callable[[str, float, dict], None]):
+        """
+        Unregisters a function registered with :meth:`Metrics.add_hook`.
+
+        Returns:
+            :obj:`None`
+        """
+        self.__hooks__.remove(hook)
+
+    def inc(self, name: str, value: float=1, **labels):
+        """
+        Increases a counter.
+
+        Parameters:
+            name (:obj:`str`): Name of the counter.
+            value (:obj:`float`, Optional): Amount added to the counter.
+            **labels: Labels of the series.
+
+        Returns:
+            :obj:`None`
+        """
+        series = (name, tuple(sorted(labels.items())))
+        self.counters[series] = self.counters.get(series, 0) + value
+        for hook in self.__hooks__:
+            hook(name, value, labels)
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Adds a value to a histogram.
+
+        Parameters:
+            name (:obj:`str`): Name of the histogram.
+            value (:obj:`float`): Observed value.
+            **labels: Labels of the series.
+
+        Returns:
+            :obj:`None`
+        """
+        series = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(series)
+        if histogram is None:
+            histogram = self.histograms[series] = Histogram(self.buckets)
+        histogram.observe(value)
+        for hook in self.__hooks__:
+            hook(name, value, labels)
+
+    def gauge(self, name: str, function: Callable[[], float]):
+        """
+        Registers a gauge, its value is read from the function when the metrics are exported.
+
+        Parameters:
+            name (:obj:`str`): Name of the gauge.
+            function (:obj:`Callable`): Function returning the current value.
+
+        Returns:
+            :obj:`None`
+        """
+        self.gauges[name] = function
+
+    def get(self, name: str, **labels):
+        """
+        Returns the value of a counter, ``0`` if it was never increased.
+        """
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def cache_hit_ratio(self):
+        """
+        Returns the ratio of the datapacks read from the cache to the ones read from the cache or fetched again after being evicted, ``None`` if nothing was read.
+        """
+        hits, misses = self.get("telegramdb_cache_hits_total"), self.get("telegramdb_cache_misses_total")
+        return hits / (hits + misses) if hits + misses else None
+
+    def export_prometheus(self):
+        """
+        Returns the metrics in the text exposition format of Prometheus, to be served on a ``/metrics`` endpoint.
+
+        Returns:
+            :obj:`str`
+        """
+        def format_labels(labels: Iterable[Tuple[str, object]]):
+            labels = ",".join(f'{key}="{_escape_label(str(value))}"' for key, value in labels)
+            return f"{{{labels}}}" if labels else ""
+
+        lines, typed = [], set()
+        for (name, labels), value in sorted(self.counters.items(), key=lambda item: item[0]):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            seen = 0
+            for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                seen += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', le),))} {seen}")
+            lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        for name, function in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {function()}")
+        return "\n".join(lines) + "\n"
+
+def instrumented(operation: str):
+    """
+    Decorator which records the latency and the failures of a database operation in the :class:`Metrics` of the session, if it has any.
+
+    Parameters:
+        operation (:obj:`str`): Name of the operation, the ``operation`` label of its series.
+    """
+    def decorator(function: Callable):
+        def record(metrics: Metrics, started: float, error: bool):
+            metrics.observe("telegramdb_operation_seconds", perf_counter() - started, operation=operation)
+            if error:
+                metrics.inc("telegramdb_operation_errors_total", operation=operation)
+
+        if inspect.iscoroutinefunction(function):
+            @wraps(function)
+            async def wrapper(self, *args, **kwargs):
+                if self.metrics is None:
+                    return await function(self, *args, **kwargs)
+                started, error = perf_counter(), True
+                try:
+                    result = await function(self, *args, **kwargs)
+                    error = False
+                    return result
+                finally:
+                    record(self.metrics, started, error)
+        else:
+            @wraps(function)
+            def wrapper(self, *args, **kwargs):
+                if self.metrics is None:
+                    return function(self, *args, **kwargs)
+                started, error = perf_counter(), True
+                try:
+                    result = function(self, *args, **kwargs)
+                    error = False
+                    return result
+                finally:
+                    record(self.metrics, started, error)
+        return wrapper
+    return decorator
@@ -0,0 +1,316 @@
+# TelegramDB
+# Copyright (C) 2023
+# Anony <github.com/anonyindian>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from itertools import islice
+from typing import AsyncIterator, Callable, Iterator, List, Optional
+from .constants import GET_MESSAGES_LIMIT
+from .index import SortedIndex, sort_key
+
+__all__ = ["Query"]
+
+class Query:
+    """
+    Lazy query over the datapacks of a single :class:`DataPack` subclass, use :meth:`TelegramDB.query` to create it.
+
+    Note:
+        Every method returns a new query, the datapacks are built one at a time while iterating over the partition of the type.
+        Evicted datapacks are read from the snapshot of the session, the other ones are fetched from telegram in chunks of ``GET_MESSAGES_LIMIT`` messages before they are returned.
+        A query of an :class:`AsyncTelegramDB` with evicted datapacks must be iterated with ``async for``, iterating it with ``for`` raises :class:`EvictedDataPack` when a datapack has to be fetched.
+        Sorted queries and ranges scan the index of an ordered :class:`Member` without building the other datapacks, the datapacks are read and sorted first if the member isn't ordered.
+
+    Parameters:
+        session (:class:`AsyncTelegramDB`): Session whose cache is queried.
+        datapack_class (:obj:`type`): Subclass of the `DataPack` to be queried.
+
+    Example:
+        .. code-block:: python
+
+            query = SESSION.query(User).filter(lambda user: user.name.startswith("A"), username="telegram")
+            for user in query.only("id", "name").limit(10):
+                print(user.id, user.name)
+
+            # pages of 100 users by score, from the highest one
+            page = SESSION.query(User).order_by("score", reverse=True).limit(100).all()
+            page = SESSION.query(User).order_by("score", reverse=True).after(page[-1]).limit(100).all()
+
+            # AsyncTelegramDB
+            users = [user async for user in SESSION.query(User).filter(username="telegram")]
+    """
+    def __init__(self, session, datapack_class: type):
+        self.__session__ = session
+        self.__datapack_class__ = datapack_class
+        self.__predicates__: List[Callable] = []
+        self.__members__: dict = {}
+        self.__limit__: Optional[int] = None
+        self.__only__: Optional[tuple] = None
+        self.__order__: Optional[tuple] = None
+        self.__bounds__: dict = {}
+        self.__after__: Optional[dict] = None
+
+    def __clone__(self):
+        query = Query(self.__session__, self.__datapack_class__)
+        query.__predicates__ = list(self.__predicates__)
+        query.__members__ = dict(self.__members__)
+        query.__limit__ = self.__limit__
+        query.__only__ = self.__only__
+        query.__order__ = self.__order__
+        query.__bounds__ = dict(self.__bounds__)
+        query.__after__ = self.__after__
+        return query
+
+    def filter(self, *predicates: Callable, **members):
+        """
+        Use this method to keep only the datapacks matching all the given conditions.
+
+        Parameters:
+            *predicates (:obj:`Callable`): Functions called with the datapack, which must return ``True`` to keep it.
+            **members: Values of the members to be matched, indexed members are looked up in their index.
+
+        Returns:
+            :class:`Query`
+        """
+        query = self.__clone__()
+        query.__predicates__.extend(predicates)
+        schema = self.__datapack_class__.__schema__
+        query.__members__.update({member: schema.encode(member, value) for member, value in members.items()})
+        return query
+
+    def between(self, member: str, low=None, high=None):
+        """
+        Use this method to keep only the datapacks with a value of the member in the given range.
+
+        Parameters:
+            member (:obj:`str`): Name of the member, ordered members are scanned in their index.
+            low (:obj:`Any`, Optional): Lowest value, included. The range is open if not provided.
+            high (:obj:`Any`, Optional): Highest value, included. The range is open if not provided.
+
+        Returns:
+            :class:`Query`
+        """
+        query = self.__clone__()
+        schema = self.__datapack_class__.__schema__
+        query.__bounds__[member] = (schema.encode(member, low), schema.encode(member, high))
+        return query
+
+    def order_by(self, member: str, reverse: bool=False):
+        """
+        Use this method to sort the datapacks by a member, the datapacks with the same value are sorted by their primary key.
+
+        Parameters:
+            member (:obj:`str`): Name of the member, ordered members are scanned in their index.
+            reverse (:obj:`bool`, Optional): The datapacks are sorted from the highest value if it is set to ``True``.
+
+        Returns:
+            :class:`Query`
+        """
+        query = self.__clone__()
+        query.__order__ = (member, reverse)
+        return query
+
+    def after(self, datapack):
+        """
+        Use this method to start the query after a datapack, e.g. the last one of the previous page. The datapacks are sorted by the primary key if :meth:`Query.order_by` isn't used.
+
+        Parameters:
+            datapack (:class:`DataPack`): Datapack used as a cursor, it doesn't need to be stored anymore.
+
+        Returns:
+            :class:`Query`
+        """
+        query = self.__clone__()
+        query.__after__ = datapack.__get_dict__()
+        return query
+
+    def limit(self, count: int):
+        """
+        Use this method to stop the query after the given number of datapacks.
+
+        Parameters:
+            count (:obj:`int`): Maximum number of datapacks.
+
+        Returns:
+            :class:`Query`
+        """
+        query = self.__clone__()
+        query.__limit__ = count
+        return query
+
+    def only(self, *members: str):
+        """
+        Use this method to set only the given members on the returned datapacks.
+
+        Parameters:
+            *members (:obj:`str`): Names of the members.
+
+        Returns:
+            :class:`Query`
+        """
+        query = self.__clone__()
+        query.__only__ = members
+        return query
+
+    def all(self):
+        """
+        Use this method to get all the datapacks of the query.
+
+        Returns:
+            A list containing elements of object ``datapack_class``
+        """
+        return list(self)
+
+    def first(self):
+        """
+        Use this method to get the first datapack of the query.
+
+        Returns:
+            Object of ``datapack_class``, ``None`` if nothing matches.
+        """
+        return next(iter(self.limit(1)), None)
+
+    def count(self):
+        """
+        Use this method to count the datapacks of the query.
+
+        Returns:
+            :obj:`int`
+        """
+        return sum(1 for _ in self)
+
+    def __keys__(self, partition, order: Optional[str]=None, reverse: bool=False, cursor: Optional[tuple]=None, records: Optional[dict]=None):
+        keys = None
+        for member, value in self.__members__.items():
+            if member in partition.indexes:
+                found = partition.indexes[member].get(value)
+                keys = set(found) if keys is None else keys & found
+        if order is None:
+            # any range over an ordered member narrows the scan
+            order = next((member for member in self.__bounds__ if isinstance(partition.indexes.get(member), SortedIndex)), None)
+            if order is None:
+                return partition.keys() if keys is None else list(keys)
+        index = partition.indexes.get(order)
+        if isinstance(index, SortedIndex):
+            low, high = self.__bounds__.get(order, (None, None))
+            ordered = index.range(low, high, reverse, cursor)
+            return ordered if keys is None else (key for key in ordered if key in keys)
+        positions = {}
+        for key in (partition.keys() if keys is None else keys):
+            record = self.__record__(partition, key, records)
+            if record is not None:
+                positions[key] = (sort_key(record.data.get(order)), sort_key(key))
+        return sorted(positions, key=positions.__getitem__, reverse=reverse)
+
+    def __record__(self, partition, key, records: Optional[dict]=None):
+        return (records or {}).get(key) or self.__session__.__get_record__(partition, key)
+
+    def __read__(self, partition, keys, records: dict):
+        missing = []
+        for key in keys:
+            if key not in records:
+                record = self.__session__.__get_record__(partition, key)
+                if record is not None:
+                    records[key] = record
+                elif key in partition.evicted:
+                    missing.append(key)
+        if missing:
+            # the caller fetches them from telegram and sends their records back
+            records.update((yield (partition, missing)))
+
+    def __in_bounds__(self, data: dict):
+        for member, (low, high) in self.__bounds__.items():
+            value = sort_key(data.get(member))
+            if (low is not None and value < sort_key(low)) or (high is not None and value > sort_key(high)):
+                return False
+        return True
+
+    def __build__(self, data: dict, members: Optional[tuple]):
+        obj = self.__datapack_class__.__new__(self.__datapack_class__)
+        obj.__set_dict__(data if members is None else {key: data[key] for key in members if key in data})
+        return obj
+
+    def __scan__(self):
+        # it yields the datapacks, and (partition, keys) tuples of the evicted ones which have to be fetched
+        partition = self.__session__.__store__.partitions.get(self.__datapack_class__.__datapack_name__)
+        if partition is None:
+            return
+        order, reverse = self.__order__ or (None, False)
+        cursor = None
+        if self.__after__ is not None:
+            order = order or partition.primary_key
+            cursor = (self.__after__.get(order), self.__after__.get(partition.primary_key))
+            position = (sort_key(cursor[0]), sort_key(cursor[1]))
+        records = {}
+        if order is not None and not isinstance(partition.indexes.get(order), SortedIndex):
+            # every datapack is read to be sorted by a member which isn't ordered
+            yield from self.__read__(partition, self.__keys__(partition), records)
+        keys = iter(self.__keys__(partition, order, reverse, cursor, records))
+        count = 0
+        while True:
+            size = GET_MESSAGES_LIMIT if self.__limit__ is None else min(GET_MESSAGES_LIMIT, self.__limit__ - count)
+            chunk = list(islice(keys, size)) if size > 0 else []
+            if not chunk:
+                return
+            yield from self.__read__(partition, chunk, records)
+            for key in chunk:
+                if self.__limit__ is not None and count >= self.__limit__:
+                    return
+                record = records.pop(key, None)
+                if record is None:
+                    continue
+                data = record.data
+                if not all(member in data and data[member] == value for member, value in self.__members__.items()):
+                    continue
+                if self.__bounds__ and not self.__in_bounds__(data):
+                    continue
+                if cursor is not None:
+                    current = (sort_key(data.get(order)), sort_key(key))
+                    if current == position or (current < position) != reverse:
+                        continue
+                if self.__predicates__:
+                    obj = self.__build__(data, None)
+                    if not all(predicate(obj) for predicate in self.__predicates__):
+                        continue
+                    if self.__only__ is not None:
+                        obj = self.__build__(data, self.__only__)
+                else:
+                    obj = self.__build__(data, self.__only__)
+                count += 1
+                yield obj
+
+    def __iter__(self) -> Iterator:
+        scan, fetched = self.__scan__(), None
+        while True:
+            try:
+                step = scan.send(fetched)
+            except StopIteration:
+                return
+            if isinstance(step, tuple):
+                fetched = self.__session__.__read_evicted__(*step)
+            else:
+                fetched = None
+                yield step
+
+    async def __aiter__(self) -> AsyncIterator:
+        scan, fetched = self.__scan__(), None
+        while True:
+            try:
+                step = scan.send(fetched)
+            except StopIteration:
+                return
+            if isinstance(step, tuple):
+                fetched = await self.__session__.__fetch_evicted__(*step)
+            else:
+                fetched = None
+                yield step
@@ -0,0 +1,205 @@
+# TelegramDB
+# Copyright (C) 2023
+# Anony <github.com/anonyindian>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio, random, sys
+from time import monotonic
+from typing import Awaitable, Callable, Dict, Union
+from .exceptions import FloodWait
+from .metrics import Metrics
+
+__all__ = ["TokenBucket", "Scheduler"]
+
+TRANSIENT_ERRORS = (asyncio.TimeoutError, ConnectionError)
+
+def library_errors(module: str, *names: str):
+    """
+    Returns the error classes of a client library, an empty tuple if the library isn't imported.
+
+    Note:
+        Errors of a library can only be raised after it is imported by its client, so checking them doesn't import it.
+    """
+    errors = sys.modules.get(module)
+    return tuple(getattr(errors, name) for name in names) if errors else ()
+
+def is_transient(error: Exception):
+    """
+    Returns whether an error of pyrogram, telethon or the network is worth retrying.
+    """
+    return isinstance(error, TRANSIENT_ERRORS + library_errors("pyrogram.errors", "InternalServerError", "ServiceUnavailable")
+        + library_errors("telethon.errors", "ServerError", "TimedOutError", "RpcCallFailError"))
+
+def get_flood_wait(error: Exception):
+    """
+    Returns the seconds to wait asked by a flood error of pyrogram, telethon or a :class:`Backend`, ``None`` for any other error.
+    """
+    if isinstance(error, FloodWait):
+        return error.seconds
+    if isinstance(error, library_errors("pyrogram.errors", "Flood")) and isinstance(error.value, int):
+        return error.value
+    if isinstance(error, library_errors("telethon.errors", "FloodError")):
+        return getattr(error, "seconds", None)
+    return None
+
+class TokenBucket:
+    """
+    Token bucket which paces the requests sent to telegram.
+
+    Parameters:
+        rate (:obj:`float`): Tokens added to the bucket every second.
+        capacity (:obj:`int`): Maximum number of tokens in the bucket, the size of a burst of requests.
+    """
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = monotonic()
+        self.blocked_until = 0.0
+        self.__lock__ = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Waits until a token is available and takes it.
+
+        Returns:
+            :obj:`None`
+        """
+        async with self.__lock__:
+            while True:
+                now = monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def block(self, seconds: float):
+        """
+        Empties the bucket and stops handing out tokens for the given seconds.
+
+        Parameters:
+            seconds (:obj:`float`): Seconds to wait before the next token.
+
+        Returns:
+            :obj:`None`
+        """
+        self.blocked_until = max(self.blocked_until, monotonic() + seconds)
+        self.tokens = 0.0
+
+class Scheduler:
+    """
+    Scheduler which every request of :class:`TelegramDB` goes through, it paces the requests per chat, honours the flood waits asked by telegram and retries transient failures.
+
+    Note:
+        The same scheduler can be shared by multiple sessions using the same telegram account.
+
+    Parameters:
+        rate (:obj:`float`, Optional): Requests per second sent to a single chat.
+        burst (:obj:`int`, Optional): Requests that can be sent to a single chat at once before the rate applies.
+        global_rate (:obj:`float`, Optional): Requests per second sent to all the chats.
+        read_rate (:obj:`float`, Optional): Read requests per second made to a single chat, see :meth:`Scheduler.read`.
+        max_retries (:obj:`int`, Optional): Maximum retries of a request after a flood wait or a transient failure.
+        backoff (:obj:`float`, Optional): Seconds to wait before the first retry of a transient failure, doubled on every retry.
+        max_flood_wait (:obj:`float`, Optional): Flood waits longer than these seconds are raised instead of waited.
+        metrics (:class:`Metrics`, Optional): Registry in which the requests, the retries and the flood waits are counted, the one of the first session using the scheduler if not provided.
+
+    Example:
+        .. code-block:: python
+
+            from telegramdb import TelegramDB, Scheduler
+
+            SESSION = TelegramDB(client, chat_id, scheduler=Scheduler(rate=0.5))
+    """
+    def __init__(self, rate: float=1.0, burst: int=20, global_rate: float=30.0, read_rate: float=10.0, max_retries: int=5, backoff: float=0.5, max_flood_wait: float=300.0, metrics: Metrics=None):
+        self.rate = rate
+        self.read_rate = read_rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_flood_wait = max_flood_wait
+        self.metrics = metrics
+        self.__global__ = TokenBucket(global_rate, max(burst, int(global_rate)))
+        self.__chats__: Dict[Union[int, str], TokenBucket] = {}
+        self.__reads__: Dict[Union[int, str], TokenBucket] = {}
+
+    def __bucket__(self, peer: Union[int, str]):
+        if peer not in self.__chats__:
+            self.__chats__[peer] = TokenBucket(self.rate, self.burst)
+        return self.__chats__[peer]
+
+    def __read_bucket__(self, peer: Union[int, str]):
+        if peer not in self.__reads__:
+            self.__reads__[peer] = TokenBucket(self.read_rate, self.burst)
+        return self.__reads__[peer]
+
+    async def call(self, peer: Union[int, str], function: Callable[..., Awaitable], *args, **kwargs):
+        """
+        Use this method to make a request to telegram through the scheduler.
+
+        Parameters:
+            peer (:obj:`int` | :obj:`str`): Chat the request is sent to.
+            function (:obj:`Callable`): Coroutine function of the telegram client.
+            *args, **kwargs: Arguments of the coroutine function.
+
+        Returns:
+            Result of the request.
+        """
+        return await self.__request__((self.__bucket__(peer), self.__global__), function, args, kwargs)
+
+    async def read(self, peer: Union[int, str], function: Callable[..., Awaitable], *args, **kwargs):
+        """
+        Use this method to make a read-only request to telegram through the scheduler, these are paced separately by ``read_rate``.
+
+        Parameters:
+            peer (:obj:`int` | :obj:`str`): Chat the request is made to.
+            function (:obj:`Callable`): Coroutine function of the telegram client.
+            *args, **kwargs: Arguments of the coroutine function.
+
+        Returns:
+            Result of the request.
+        """
+        return await self.__request__((self.__read_bucket__(peer),), function, args, kwargs)
+
+    async def __request__(self, buckets: tuple, function: Callable[..., Awaitable], args: tuple, kwargs: dict):
+        attempt = 0
+        while True:
+            for bucket in buckets:
+                await bucket.acquire()
+            if self.metrics is not None:
+                self.metrics.inc("telegramdb_requests_total", method=getattr(function, "__name__", "call"))
+            try:
+                return await function(*args, **kwargs)
+            except Exception as error:
+                if attempt >= self.max_retries:
+                    raise
+                wait = get_flood_wait(error)
+                if wait is not None:
+                    if wait > self.max_flood_wait:
+                        raise
+                    buckets[0].block(wait)
+                    if self.metrics is not None:
+                        self.metrics.inc("telegramdb_retries_total", reason="flood_wait")
+                        self.metrics.inc("telegramdb_flood_wait_seconds_total", wait)
+                elif is_transient(error):
+                    if self.metrics is not None:
+                        self.metrics.inc("telegramdb_retries_total", reason="transient")
+                    await asyncio.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.0))
+                else:
+                    raise
+                attempt += 1
@@ -0,0 +1,153 @@
+# TelegramDB
+# Copyright (C) 2023
+# Anony <github.com/anonyindian>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import base64, datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Optional, Tuple
+from .blob import Blob
+from .exceptions import InvalidMemberType
+
+__all__ = ["Schema"]
+
+MISSING = object()
+
+def _converters(datatype: Any) -> Tuple[Optional[Callable], Optional[Callable]]:
+    """
+    Returns the functions which convert a value of a member to the one written in the message and back, ``None`` for the types written as they are.
+    """
+    if not isinstance(datatype, type):
+        return None, None
+    if issubclass(datatype, datetime.datetime):
+        return datetime.datetime.isoformat, datatype.fromisoformat
+    if issubclass(datatype, datetime.date):
+        return datetime.date.isoformat, datatype.fromisoformat
+    if issubclass(datatype, Enum):
+        return (lambda value: value.value), datatype
+    if issubclass(datatype, bytes):
+        return (lambda value: base64.b64encode(value).decode()), base64.b64decode
+    if issubclass(datatype, tuple):
+        return list, datatype
+    if hasattr(datatype, "__members__"):
+        # nested datapack, its methods are looked up when called as it may be the datapack being compiled
+        def load(data: dict):
+            obj = datatype.__new__(datatype)
+            obj.__set_dict__(data)
+            return obj
+        return (lambda value: value.__get_dict__()), load
+    return None, None
+
+class Schema:
+    """
+    Compiled description of the members of a :class:`DataPack` class, built once when the class is defined.
+
+    Note:
+        ``__get_dict__`` and ``__set_dict__`` of the class are generated from it for its members, so copying the data of a datapack doesn't look anything up by name.
+        Values are checked against the type of their member and converted to the ones written in the message: datetimes and dates as ISO strings, enums as their value, bytes as base64, tuples as lists and nested datapacks as their data.
+        Values loaded from a message are converted back when a datapack is filled, blobs and values already of the type are left as they are.
+        Members with a type which isn't a class (e.g. ``typing.List[int]``) are neither checked nor converted.
+
+    Attributes:
+        fields (:obj:`tuple`): Names of the members, in the order they are defined.
+        types (:obj:`dict`): Type of the members mapped by their name.
+        defaults (:obj:`dict`): Default value of the members which have one, mapped by their name.
+        primary_key (:obj:`str`): Name of the primary key member, ``None`` if there is none.
+        indexes (:obj:`dict`): Whether the values of the indexed members must be unique, mapped by their name.
+        ordered (:obj:`tuple`): Names of the members indexed in order.
+    """
+    def __init__(self, datapack_class: type):
+        members = datapack_class.__members__
+        self.fields = tuple(members)
+        self.types = {name: member.type for name, member in members.items()}
+        self.defaults = {name: member.default for name, member in members.items() if member.default is not MISSING}
+        self.primary_key = next((name for name, member in members.items() if member.is_primary), None)
+        self.indexes = {name: member.unique for name, member in members.items() if member.index}
+        self.ordered = tuple(name for name, member in members.items() if member.ordered)
+        self.__encoders__: Dict[str, Callable] = {}
+        self.__decoders__: Dict[str, Callable] = {}
+        for name, datatype in self.types.items():
+            encoder, decoder = _converters(datatype)
+            if encoder:
+                self.__encoders__[name] = encoder
+                self.__decoders__[name] = decoder
+        self.get_dict, self.set_dict = self.__compile__(datapack_class)
+
+    def encode(self, name: str, value: Any):
+        """
+        Returns a value of a member as it is written in the message, e.g. to look it up in an index.
+        """
+        encoder = self.__encoders__.get(name)
+        if encoder is None or value is None or isinstance(value, Blob):
+            return value
+        return encoder(value)
+
+    def decode(self, name: str, value: Any):
+        """
+        Returns a value of a member read from a message converted to the type of the member.
+        """
+        decoder = self.__decoders__.get(name)
+        datatype = self.types.get(name)
+        if decoder is None or value is None or isinstance(value, Blob) or (isinstance(datatype, type) and isinstance(value, datatype)):
+            return value
+        return decoder(value)
+
+    def validate(self, name: str, value: Any):
+        """
+        Raises :class:`InvalidMemberType` if a value can't be stored in a member, ``None`` is always accepted.
+        """
+        datatype = self.types.get(name)
+        if value is None or not isinstance(datatype, type) or isinstance(value, (datatype, Blob)):
+            return
+        if datatype is float and isinstance(value, int) and not isinstance(value, bool):
+            return
+        raise InvalidMemberType(name, value, datatype)
+
+    def __compile__(self, datapack_class: type):
+        checked = {name: datatype for name, datatype in self.types.items() if isinstance(datatype, type) and datatype is not object}
+        namespace = {
+            "MISSING": MISSING, "Blob": Blob, "validate": self.validate, "decode": self.decode,
+            "defaults": self.defaults, "fields": frozenset(self.fields),
+        }
+        namespace.update({f"types_{i}": (checked[name], Blob) for i, name in enumerate(self.fields) if name in checked})
+        namespace.update({f"encode_{i}": self.__encoders__.get(name) for i, name in enumerate(self.fields)})
+        has_dict = datapack_class.__dictoffset__ != 0
+
+        lines = ["def get_dict(self):", "    data = {}"]
+        for i, name in enumerate(self.fields):
+            lines.append(f"    value = getattr(self, {name!r}, MISSING)")
+            if name in self.defaults:
+                lines.append(f"    if value is MISSING: value = defaults[{name!r}]")
+            lines.append("    if value is not MISSING:")
+            if name in checked:
+                lines.append(f"        if value is not None and not isinstance(value, types_{i}): validate({name!r}, value)")
+            if name in self.__encoders__:
+                lines.append(f"        if value is not None and not isinstance(value, Blob): value = encode_{i}(value)")
+            lines.append(f"        data[{name!r}] = value")
+        if has_dict:
+            lines.append("    data.update(self.__dict__)")
+            lines.append("    data.pop('__datapack_name__', None)")
+        lines.append("    return data")
+
+        lines += ["def set_dict(self, data):"]
+        for name in self.fields:
+            if name in self.__decoders__:
+                lines.append(f"    if {name!r} in data: self.{name} = decode({name!r}, data[{name!r}])")
+            else:
+                lines.append(f"    if {name!r} in data: self.{name} = data[{name!r}]")
+        if has_dict:
+            lines.append("    for attribute in data.keys() - fields: setattr(self, attribute, data[attribute])")
+        lines.append("    return None")
+        exec("\n".join(lines), namespace)
+        return namespace["get_dict"], namespace["set_dict"]
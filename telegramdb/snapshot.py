@@ -0,0 +1,285 @@
+# TelegramDB
+# Copyright (C) 2023
+# Anony <github.com/anonyindian>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import sqlite3, threading
+from functools import wraps
+from typing import Callable, Iterable, Iterator, List, Tuple, Union
+from .constants import SNAPSHOT_CHUNK_SIZE
+
+__all__ = ["Snapshot"]
+
+def _locked(method: Callable):
+    """
+    Decorator which holds the lock of the :class:`Snapshot` while a method uses its connection.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.__lock__:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class Snapshot:
+    """
+    Local copy of the database chat stored in a SQLite file, it lets :class:`TelegramDB` load only the messages sent after the last start.
+
+    Note:
+        The connection is shared by the threads which use the session, every method holds a lock while it uses it.
+
+    Parameters:
+        path (:obj:`str`): Path of the SQLite file, it is created if it doesn't exist.
+
+    Example:
+        .. code-block:: python
+
+            from telegramdb import TelegramDB
+
+            SESSION = TelegramDB(client, chat_id, snapshot="telegramdb.sqlite")
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.__lock__ = threading.RLock()
+        self.__connection__ = sqlite3.connect(path, check_same_thread=False)
+        self.__connection__.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS datapacks (name TEXT PRIMARY KEY, id INTEGER NOT NULL, text TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS datapacks_id ON datapacks (id);
+            CREATE TABLE IF NOT EXISTS windows (start INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS staged (name TEXT PRIMARY KEY, id INTEGER NOT NULL, text TEXT NOT NULL);
+        """)
+
+    @_locked
+    def load(self, chat_id: Union[int, str]):
+        """
+        Use this method to read the snapshot of a database chat, the snapshot is cleared if it belongs to another chat.
+
+        Parameters:
+            chat_id (:obj:`int` | :obj:`str`): Identifier of the database chat.
+
+        Returns:
+            :obj:`tuple`: Highest message id covered by the snapshot and an iterator of ``(name, message id, text)`` tuples, read in chunks of ``SNAPSHOT_CHUNK_SIZE`` rows.
+        """
+        row = self.__connection__.execute("SELECT value FROM meta WHERE key = 'chat_id'").fetchone()
+        if row is None or row[0] != str(chat_id):
+            self.clear()
+            with self.__connection__:
+                self.__connection__.execute("INSERT OR REPLACE INTO meta VALUES ('chat_id', ?)", (str(chat_id),))
+            return 0, iter(())
+        row = self.__connection__.execute("SELECT value FROM meta WHERE key = 'max_id'").fetchone()
+        max_id = int(row[0]) if row else 0
+        return max_id, self.__iter_rows__()
+
+    def __iter_rows__(self) -> Iterator[Tuple[str, int, str]]:
+        last = 0
+        while True:
+            with self.__lock__:
+                chunk = self.__connection__.execute(
+                    "SELECT rowid, name, id, text FROM datapacks WHERE rowid > ? ORDER BY rowid LIMIT ?", (last, SNAPSHOT_CHUNK_SIZE)
+                ).fetchall()
+            if not chunk:
+                return
+            last = chunk[-1][0]
+            for _, name, msg_id, text in chunk:
+                yield name, msg_id, text
+
+    @_locked
+    def save(self, name: str, msg_id: int, text: str):
+        """
+        Use this method to store the message of a datapack in the snapshot.
+
+        Parameters:
+            name (:obj:`str`): Name of the datapack, including its primary key.
+            msg_id (:obj:`int`): Message id of the datapack.
+            text (:obj:`str`): Text of the message.
+
+        Returns:
+            :obj:`None`
+        """
+        self.save_many([(name, msg_id, text)])
+
+    @_locked
+    def save_many(self, rows: Iterable[Tuple[str, int, str]]):
+        """
+        Use this method to store the messages of many datapacks in the snapshot at once.
+
+        Parameters:
+            rows (Iterable of :obj:`tuple`): ``(name, message id, text)`` tuples.
+
+        Returns:
+            :obj:`None`
+        """
+        with self.__connection__:
+            self.__connection__.executemany("INSERT OR REPLACE INTO datapacks VALUES (?, ?, ?)", rows)
+
+    @_locked
+    def get_text(self, msg_id: int):
+        """
+        Use this method to read the text of a message stored in the snapshot.
+
+        Parameters:
+            msg_id (:obj:`int`): Message id of the datapack.
+
+        Returns:
+            :obj:`str`: Text of the message, ``None`` if it is not stored.
+        """
+        row = self.__connection__.execute("SELECT text FROM datapacks WHERE id = ?", (msg_id,)).fetchone()
+        return row[0] if row else None
+
+    @_locked
+    def delete_ids(self, msg_ids: List[int]):
+        """
+        Use this method to remove messages from the snapshot.
+
+        Parameters:
+            msg_ids (List of :obj:`int`): Message ids to be removed.
+
+        Returns:
+            :obj:`None`
+        """
+        with self.__connection__:
+            self.__connection__.executemany("DELETE FROM datapacks WHERE id = ?", [(msg_id,) for msg_id in msg_ids])
+
+    @_locked
+    def begin_load(self, top_id: int):
+        """
+        Use this method to record that a load of the messages up to ``top_id`` has begun, it can be resumed with :meth:`Snapshot.get_load` if it is interrupted.
+
+        Parameters:
+            top_id (:obj:`int`): Highest message id of the load.
+
+        Returns:
+            :obj:`None`
+        """
+        with self.__connection__:
+            self.__connection__.execute("INSERT OR REPLACE INTO meta VALUES ('load_top_id', ?)", (str(top_id),))
+
+    @_locked
+    def get_load(self):
+        """
+        Use this method to get the interrupted load of the database chat, if any.
+
+        Returns:
+            :obj:`tuple`: Highest message id of the load and a set with the first message id of its completed windows, ``None`` if there is no interrupted load.
+        """
+        row = self.__connection__.execute("SELECT value FROM meta WHERE key = 'load_top_id'").fetchone()
+        if row is None:
+            return None
+        return int(row[0]), {start for start, in self.__connection__.execute("SELECT start FROM windows")}
+
+    @_locked
+    def complete_window(self, start: int, rows: Iterable[Tuple[str, int, str]]):
+        """
+        Use this method to store the datapacks loaded from a window of messages and mark the window as completed.
+
+        Parameters:
+            start (:obj:`int`): First message id of the window.
+            rows (Iterable of :obj:`tuple`): ``(name, message id, text)`` tuples of the window.
+
+        Returns:
+            :obj:`None`
+        """
+        with self.__connection__:
+            self.__connection__.executemany("INSERT OR REPLACE INTO datapacks VALUES (?, ?, ?)", rows)
+            self.__connection__.execute("INSERT OR REPLACE INTO windows VALUES (?)", (start,))
+
+    @_locked
+    def finish_load(self):
+        """
+        Use this method to mark the current load as completed, its highest message id becomes the one covered by the snapshot.
+
+        Returns:
+            :obj:`None`
+        """
+        load = self.get_load()
+        if load is None:
+            return
+        with self.__connection__:
+            self.__connection__.execute("INSERT OR REPLACE INTO meta VALUES ('max_id', ?)", (str(load[0]),))
+            self.__connection__.execute("DELETE FROM meta WHERE key = 'load_top_id'")
+            self.__connection__.execute("DELETE FROM windows")
+
+    @_locked
+    def stage_many(self, rows: Iterable[Tuple[str, int, str]]):
+        """
+        Use this method to store the messages of many datapacks written in another chat, they replace the snapshot on the next :meth:`Snapshot.reset`.
+
+        Parameters:
+            rows (Iterable of :obj:`tuple`): ``(name, message id, text)`` tuples.
+
+        Returns:
+            :obj:`None`
+        """
+        with self.__connection__:
+            self.__connection__.executemany("INSERT OR REPLACE INTO staged VALUES (?, ?, ?)", rows)
+
+    @_locked
+    def unstage(self):
+        """
+        Use this method to drop the messages staged with :meth:`Snapshot.stage_many`, e.g. by a rewrite which failed.
+
+        Returns:
+            :obj:`None`
+        """
+        with self.__connection__:
+            self.__connection__.execute("DELETE FROM staged")
+
+    @_locked
+    def reset(self, chat_id: Union[int, str], max_id: int, rows: Iterable[Tuple[str, int, str]]=()):
+        """
+        Use this method to replace the whole snapshot with the datapacks of another chat at once, e.g. after they were rewritten there.
+
+        Parameters:
+            chat_id (:obj:`int` | :obj:`str`): Identifier of the database chat.
+            max_id (:obj:`int`): Highest message id covered by the snapshot.
+            rows (Iterable of :obj:`tuple`, Optional): ``(name, message id, text)`` tuples, added to the ones staged with :meth:`Snapshot.stage_many`.
+
+        Returns:
+            :obj:`None`
+        """
+        with self.__connection__:
+            self.__connection__.execute("DELETE FROM datapacks")
+            self.__connection__.execute("DELETE FROM meta")
+            self.__connection__.execute("DELETE FROM windows")
+            self.__connection__.execute("INSERT INTO meta VALUES ('chat_id', ?)", (str(chat_id),))
+            self.__connection__.execute("INSERT INTO meta VALUES ('max_id', ?)", (str(max_id),))
+            self.__connection__.execute("INSERT INTO datapacks SELECT * FROM staged")
+            self.__connection__.execute("DELETE FROM staged")
+            self.__connection__.executemany("INSERT OR REPLACE INTO datapacks VALUES (?, ?, ?)", rows)
+
+    @_locked
+    def clear(self):
+        """
+        Use this method to remove everything from the snapshot.
+
+        Returns:
+            :obj:`None`
+        """
+        with self.__connection__:
+            self.__connection__.execute("DELETE FROM datapacks")
+            self.__connection__.execute("DELETE FROM meta")
+            self.__connection__.execute("DELETE FROM windows")
+            self.__connection__.execute("DELETE FROM staged")
+
+    @_locked
+    def close(self):
+        """
+        Use this method to close the SQLite file.
+
+        Returns:
+            :obj:`None`
+        """
+        self.__connection__.close()
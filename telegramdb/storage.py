@@ -0,0 +1,391 @@
+# TelegramDB
+# Copyright (C) 2023
+# Anony <github.com/anonyindian>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import hashlib, time, zlib
+from collections import namedtuple
+from typing import Any, Dict, Iterator, List, Optional, Set
+from .index import HashIndex
+from .schema import MISSING
+
+__all__ = ["Record", "Partition", "Store"]
+
+Record = namedtuple("Record", ["id", "data"])
+Record.__doc__ = """
+Record of a datapack returned by a :class:`Partition`, its message id (``0`` if it is not published yet) and data.
+"""
+
+class Partition:
+    """
+    Datapacks of a single type, mapped by the value of their primary key.
+
+    Parameters:
+        name (:obj:`str`): Name of the :class:`DataPack` type.
+        cache_size (:obj:`int`, Optional): Maximum number of records kept in memory, the least recently used ones are evicted. Unlimited if not provided.
+        cache_ttl (:obj:`float`, Optional): Seconds after which a record is evicted, it doesn't expire if not provided.
+
+    Note:
+        Records are stored as ``(message id, *values)`` tuples, the values are ordered by ``fields``.
+        Evicted records only keep their message id and the values of the indexed members, records of a type which is not prepared and unpublished records are never evicted.
+        Records of a type with buckets are stored in pages, messages shared by many records of the same bucket.
+
+    Attributes:
+        primary_key (:obj:`str`): Name of the primary key member, ``None`` until the type is prepared.
+        datapack_class (:obj:`type`): Subclass of the `DataPack` of the type, ``None`` until the type is prepared.
+        fields (List of :obj:`str`): Names of the members stored in the records.
+        records (:obj:`dict`): Packed records mapped by their primary key, from the least to the most recently used.
+        evicted (:obj:`dict`): Packed message id and indexed values of the evicted records mapped by their primary key.
+        indexes (:obj:`dict`): :class:`HashIndex` of the indexed members mapped by their name.
+        buckets (:obj:`int`): Number of buckets of the type, ``None`` if every record has its own message.
+        pages (:obj:`dict`): Bucket of the pages mapped by their message id.
+        page_keys (:obj:`dict`): Primary keys of the records stored in the pages, mapped by their message id.
+        page_digests (:obj:`dict`): Digest of the last known text of the pages, mapped by their message id.
+        message_keys (:obj:`dict`): Primary key of the record stored in each published message, mapped by its message id.
+    """
+    def __init__(self, name: str, cache_size: int=None, cache_ttl: float=None):
+        self.name = name
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.primary_key: Optional[str] = None
+        self.datapack_class: Optional[type] = None
+        self.fields: List[str] = []
+        self.__positions__: Dict[str, int] = {}
+        self.records: Dict[Any, tuple] = {}
+        self.evicted: Dict[Any, tuple] = {}
+        self.__cached_at__: Dict[Any, float] = {}
+        self.indexes: Dict[str, HashIndex] = {}
+        self.buckets: Optional[int] = None
+        self.pages: Dict[int, int] = {}
+        self.page_keys: Dict[int, Set[Any]] = {}
+        self.page_digests: Dict[int, bytes] = {}
+        self.message_keys: Dict[int, Any] = {}
+
+    def __pack__(self, msg_id: int, data: dict):
+        for field in data:
+            if field not in self.__positions__:
+                self.__positions__[field] = len(self.fields)
+                self.fields.append(field)
+        values = [msg_id]
+        values.extend(data.get(field, MISSING) for field in self.fields)
+        while values[-1] is MISSING:
+            values.pop()
+        return tuple(values)
+
+    def __unpack__(self, record: tuple):
+        return Record(record[0], {field: value for field, value in zip(self.fields, record[1:]) if value is not MISSING})
+
+    def keys(self):
+        """
+        Returns a list with the primary keys of the stored datapacks, including the evicted ones.
+        """
+        return list(self.records) + list(self.evicted)
+
+    def __len__(self):
+        return len(self.records) + len(self.evicted)
+
+    def __contains__(self, key: Any):
+        return key in self.records or key in self.evicted
+
+    def key_of(self, key_text: Optional[str], data: dict):
+        """
+        Returns the primary key of a datapack loaded from a message, the typed value of the member is preferred over the text of the message name.
+
+        Parameters:
+            key_text (:obj:`str`): Primary key written in the name of the message, ``None`` if there is none.
+            data (:obj:`dict`): Data of the datapack.
+
+        Returns:
+            Value of the primary key.
+        """
+        if self.primary_key is not None and self.primary_key in data:
+            return data[self.primary_key]
+        return key_text
+
+    def prepare(self, primary_key: Optional[str], indexes: Dict[str, HashIndex], datapack_class: type=None, buckets: int=None):
+        """
+        Sets the primary key and the indexes of the type, the loaded records are keyed by the typed primary key and indexed.
+
+        Parameters:
+            primary_key (:obj:`str`): Name of the primary key member.
+            indexes (:obj:`dict`): :class:`HashIndex` of the indexed members mapped by their name.
+            datapack_class (:obj:`type`, Optional): Subclass of the `DataPack` of the type.
+            buckets (:obj:`int`, Optional): Number of buckets in which the records are stored, they need a primary key.
+
+        Returns:
+            :obj:`None`
+        """
+        self.primary_key = primary_key
+        self.datapack_class = datapack_class
+        self.buckets = buckets if primary_key is not None else None
+        for field in getattr(datapack_class, "__members__", ()):
+            if field not in self.__positions__:
+                self.__positions__[field] = len(self.fields)
+                self.fields.append(field)
+        records = self.records
+        self.records = {}
+        for key, record in records.items():
+            record = self.__unpack__(record)
+            typed_key = self.key_of(key, record.data)
+            self.records[typed_key] = self.__pack__(record.id, record.data)
+            if key in self.__cached_at__:
+                self.__cached_at__[typed_key] = self.__cached_at__.pop(key)
+        self.indexes = indexes
+        self.page_keys = {msg_id: set() for msg_id in self.pages}
+        self.message_keys = {}
+        for entries in (self.records, self.evicted):
+            for key, record in entries.items():
+                if record[0]:
+                    self.message_keys[record[0]] = key
+                if record[0] in self.page_keys:
+                    self.page_keys[record[0]].add(key)
+                data = self.__unpack__(record).data
+                for member, index in indexes.items():
+                    if member in data:
+                        index.add(key, data[member])
+        self.__evict__()
+
+    def get(self, key: Any):
+        """
+        Returns the :class:`Record` of a datapack, ``None`` if it is not stored or it is evicted.
+        """
+        record = self.records.get(key)
+        if record is None:
+            return None
+        if self.cache_ttl is not None and time.monotonic() - self.__cached_at__.get(key, 0) > self.cache_ttl and self.__evict_key__(key):
+            return None
+        if self.cache_size is not None:
+            # move it to the end of the least recently used order
+            self.records[key] = self.records.pop(key)
+        return self.__unpack__(record)
+
+    def get_id(self, key: Any):
+        """
+        Returns the message id of a datapack, evicted or not, ``None`` if it is not stored.
+        """
+        record = self.records.get(key) or self.evicted.get(key)
+        return None if record is None else record[0]
+
+    def set(self, key: Any, msg_id: int, data: dict):
+        """
+        Stores the record of a datapack and updates the indexes of its members.
+
+        Parameters:
+            key (:obj:`Any`): Primary key of the datapack.
+            msg_id (:obj:`int`): Message id of the datapack, ``0`` if it is not published yet.
+            data (:obj:`dict`): Data of the datapack.
+
+        Returns:
+            :obj:`None`
+        """
+        if self.indexes:
+            old = self.records.get(key) or self.evicted.get(key)
+            old = old and self.__unpack__(old)
+            for member, index in self.indexes.items():
+                if old and member in old.data:
+                    index.remove(key, old.data[member])
+                if member in data:
+                    index.add(key, data[member])
+        self.__move_page__(key, self.get_id(key), msg_id)
+        self.evicted.pop(key, None)
+        self.records.pop(key, None)
+        self.records[key] = self.__pack__(msg_id, data)
+        if self.cache_ttl is not None:
+            self.__cached_at__[key] = time.monotonic()
+        self.__evict__()
+
+    def set_id(self, key: Any, msg_id: int):
+        """
+        Changes the message id of a stored datapack.
+
+        Parameters:
+            key (:obj:`Any`): Primary key of the datapack.
+            msg_id (:obj:`int`): New message id of the datapack.
+
+        Returns:
+            :obj:`None`
+        """
+        entries = self.records if key in self.records else self.evicted
+        self.__move_page__(key, entries[key][0], msg_id)
+        entries[key] = (msg_id,) + entries[key][1:]
+        self.__evict__()
+
+    def pop(self, key: Any):
+        """
+        Removes the record of a datapack and removes it from the indexes of its members.
+
+        Parameters:
+            key (:obj:`Any`): Primary key of the datapack.
+
+        Returns:
+            :class:`Record`: The removed record, only with the indexed values if it was evicted, ``None`` if the datapack is not stored.
+        """
+        record = self.records.pop(key, None) or self.evicted.pop(key, None)
+        self.__cached_at__.pop(key, None)
+        if record is None:
+            return None
+        self.__move_page__(key, record[0], None)
+        record = self.__unpack__(record)
+        for member, index in self.indexes.items():
+            if member in record.data:
+                index.remove(key, record.data[member])
+        return record
+
+    def keys_at(self, msg_id: int):
+        """
+        Returns a list with the primary keys of the datapacks stored in a message, evicted or not.
+        """
+        if msg_id in self.page_keys:
+            return list(self.page_keys[msg_id])
+        return [self.message_keys[msg_id]] if msg_id in self.message_keys else []
+
+    def bucket_of(self, key: Any):
+        """
+        Returns the bucket of a primary key, the same in every session.
+        """
+        return zlib.crc32(str(key).encode()) % self.buckets
+
+    def bucket_pages(self, bucket: int):
+        """
+        Returns a list with the message ids of the pages of a bucket.
+        """
+        return [msg_id for msg_id, page_bucket in self.pages.items() if page_bucket == bucket]
+
+    def add_page(self, msg_id: int, bucket: int):
+        """
+        Registers a message as a page of a bucket.
+
+        Parameters:
+            msg_id (:obj:`int`): Message id of the page.
+            bucket (:obj:`int`): Bucket of the page.
+
+        Returns:
+            :obj:`None`
+        """
+        if msg_id not in self.pages:
+            self.pages[msg_id] = bucket
+            self.page_keys[msg_id] = set()
+
+    def remove_page(self, msg_id: int):
+        """
+        Unregisters a page, it does nothing if the message isn't a page.
+
+        Parameters:
+            msg_id (:obj:`int`): Message id of the page.
+
+        Returns:
+            :obj:`None`
+        """
+        self.pages.pop(msg_id, None)
+        self.page_keys.pop(msg_id, None)
+        self.page_digests.pop(msg_id, None)
+
+    def set_page_text(self, msg_id: int, text: str):
+        """
+        Remembers the text of a page as it is published, it does nothing if the message isn't a page.
+
+        Parameters:
+            msg_id (:obj:`int`): Message id of the page.
+            text (:obj:`str`): Text of the page.
+
+        Returns:
+            :obj:`None`
+        """
+        if msg_id in self.pages:
+            self.page_digests[msg_id] = self.page_digest(text)
+
+    def is_page_text(self, msg_id: int, text: str):
+        """
+        Returns ``True`` if a page is known to be published with the given text, so it doesn't need to be edited.
+        """
+        return msg_id in self.page_digests and self.page_digests[msg_id] == self.page_digest(text)
+
+    @staticmethod
+    def page_digest(text: str):
+        """
+        Returns the digest of the text of a page kept in ``page_digests``.
+        """
+        return hashlib.sha1(text.encode()).digest()
+
+    def __move_page__(self, key: Any, old_id: Optional[int], msg_id: Optional[int]):
+        if old_id in self.page_keys:
+            self.page_keys[old_id].discard(key)
+        if msg_id in self.page_keys:
+            self.page_keys[msg_id].add(key)
+        if old_id and self.message_keys.get(old_id) == key:
+            del self.message_keys[old_id]
+        if msg_id:
+            self.message_keys[msg_id] = key
+
+    def __evict_key__(self, key: Any):
+        record = self.records[key]
+        if self.primary_key is None or record[0] == 0:
+            return False
+        del self.records[key]
+        self.__cached_at__.pop(key, None)
+        data = self.__unpack__(record).data
+        self.evicted[key] = self.__pack__(record[0], {member: data[member] for member in self.indexes if member in data})
+        return True
+
+    def __evict__(self):
+        if self.cache_size is None or self.primary_key is None:
+            return
+        while len(self.records) > self.cache_size:
+            # unpublished records are kept until they get a message id
+            key = next((key for key, record in self.records.items() if record[0]), None)
+            if key is None:
+                return
+            self.__evict_key__(key)
+
+class Store:
+    """
+    In-memory storage of a :class:`TelegramDB` session, partitioned by the name of the :class:`DataPack` types.
+
+    Parameters:
+        cache_size (:obj:`int`, Optional): Maximum number of records of every type kept in memory.
+        cache_ttl (:obj:`float`, Optional): Seconds after which a record is evicted.
+    """
+    def __init__(self, cache_size: int=None, cache_ttl: float=None):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.partitions: Dict[str, Partition] = {}
+
+    def __len__(self):
+        return sum(len(partition) for partition in self.partitions.values())
+
+    def __iter__(self) -> Iterator[Partition]:
+        return iter(list(self.partitions.values()))
+
+    def partition(self, name: str):
+        """
+        Returns the partition of a type, it is created if it doesn't exist.
+
+        Parameters:
+            name (:obj:`str`): Name of the :class:`DataPack` type.
+
+        Returns:
+            :class:`Partition`
+        """
+        if name not in self.partitions:
+            self.partitions[name] = Partition(name, self.cache_size, self.cache_ttl)
+        return self.partitions[name]
+
+    def counts(self):
+        """
+        Returns the number of datapacks of every type.
+
+        Returns:
+            :obj:`dict`
+        """
+        return {name: len(partition) for name, partition in self.partitions.items()}